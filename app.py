@@ -4,6 +4,7 @@ Web interface for triggering GitHub Actions workflows with collaborator verifica
 """
 import os
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
@@ -14,6 +15,7 @@ from dotenv import load_dotenv
 import config
 
 from backend.routes import auth, workflow, api
+from backend.services.http_client import close_client
 
 # Load environment variables
 load_dotenv()
@@ -26,10 +28,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan: close shared GitHub HTTP client on shutdown"""
+    yield
+    await close_client()
+
+
 app = FastAPI(
     title="GitHub Action Executor",
     description="Web interface for triggering GitHub Actions workflows",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add request logging middleware
@@ -8,9 +8,9 @@ from pydantic import BaseModel
 from typing import Optional, List
 
 from backend.services.permissions import check_repository_access
-from backend.services.workflow import trigger_workflow, find_workflow_run
+from backend.services.workflow import trigger_workflow, poll_for_workflow_run
 from backend.services.branches import get_branches
-from backend.services.workflows import get_workflows
+from backend.services.workflows import get_workflows, get_workflows_with_inputs
 import config
 
 logger = logging.getLogger(__name__)
@@ -106,10 +106,8 @@ async def api_get_branches(
         repo: Repository name
     """
     try:
-        # Используем паттерны из конфига
-        env_patterns = config.BRANCH_FILTER_PATTERNS if config.BRANCH_FILTER_PATTERNS else None
-        
-        branches = await get_branches(owner, repo, env_patterns=env_patterns)
+        # Используем паттерны из конфига (скомпилированы при загрузке)
+        branches = await get_branches(owner, repo, branch_filters=config.BRANCH_FILTER_REGEXES)
         return {"branches": branches}
     except httpx.HTTPStatusError as e:
         # Извлекаем сообщение об ошибке из ответа GitHub
@@ -131,11 +129,22 @@ async def api_get_branches(
 async def api_get_workflows(
     owner: str = Query(...),
     repo: str = Query(...),
+    with_inputs: bool = Query(False),
     request: Request = None
 ):
-    """API endpoint to get workflows for a repository"""
+    """
+    API endpoint to get workflows for a repository
+    
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        with_inputs: Also return workflow_dispatch inputs of every workflow (fetched concurrently)
+    """
     try:
-        workflows = await get_workflows(owner, repo)
+        if with_inputs:
+            workflows = await get_workflows_with_inputs(owner, repo)
+        else:
+            workflows = await get_workflows(owner, repo)
         return {"workflows": workflows}
     except httpx.HTTPStatusError as e:
         # Извлекаем сообщение об ошибке из ответа GitHub
@@ -220,7 +229,8 @@ async def api_find_run(
                 user_token = access_token
                 expected_actor_login = user.get("login")
         
-        run_data = await find_workflow_run(
+        # Wait server-side with backoff instead of answering every frontend poll immediately
+        run_data = await poll_for_workflow_run(
             owner, repo, workflow_id, trigger_dt, 
             ref=ref, 
             user_token=user_token,
@@ -3,6 +3,8 @@ Authentication routes for GitHub OAuth
 """
 import secrets
 import logging
+from functools import lru_cache
+from typing import Optional
 from urllib.parse import urlparse
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
@@ -13,37 +15,26 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def validate_redirect_url(url: str, request: Request) -> str:
+@lru_cache(maxsize=1024)
+def _normalize_redirect_url(url: str, request_host: Optional[str]) -> Optional[str]:
     """
-    Validate and normalize redirect URL for security.
-    Only allows internal paths (starting with /) to prevent open redirect attacks.
+    Normalize redirect URL to an internal path (pure, memoized: logins repeat the same URLs)
     
     Args:
-        url: URL to validate
-        request: Request object to get base URL
+        url: Non-empty URL to normalize
+        request_host: Host name of the current request
         
     Returns:
-        Normalized internal path (relative URL)
-        
-    Raises:
-        HTTPException: If URL is invalid or external
+        Internal path (relative URL), or None if URL points to another host
     """
-    if not url:
-        return "/"
-    
     # Parse URL
     parsed = urlparse(url)
     
     # If URL has scheme (http/https), check if it's internal
     if parsed.scheme:
-        # Get base URL from request
-        base_url = str(request.base_url).rstrip('/')
-        request_host = request.url.hostname
-        
         # Allow only same host
         if parsed.netloc and parsed.netloc != request_host:
-            logger.warning(f"External redirect URL blocked: {url}")
-            return "/"
+            return None
         
         # Extract path and query
         path = parsed.path or "/"
@@ -60,6 +51,28 @@ def validate_redirect_url(url: str, request: Request) -> str:
     return url
 
 
+def validate_redirect_url(url: str, request: Request) -> str:
+    """
+    Validate and normalize redirect URL for security.
+    Only allows internal paths (starting with /) to prevent open redirect attacks.
+    
+    Args:
+        url: URL to validate
+        request: Request object to get the request host
+        
+    Returns:
+        Normalized internal path (relative URL)
+    """
+    if not url:
+        return "/"
+    
+    path = _normalize_redirect_url(url, request.url.hostname)
+    if path is None:
+        logger.warning(f"External redirect URL blocked: {url}")
+        return "/"
+    return path
+
+
 @router.get("/github")
 async def github_login(request: Request, redirect_after: str = None):
     """
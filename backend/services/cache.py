@@ -2,18 +2,52 @@
 Simple in-memory cache with TTL (Time To Live)
 """
 import time
+import heapq
+import asyncio
 import logging
-from typing import Optional, Any, Dict, Tuple
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Optional, Any, Awaitable, Callable, Dict, Hashable, List, Tuple
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
-# Cache storage: {key: (value, expiry_timestamp)}
-_cache: Dict[str, Tuple[Any, float]] = {}
+# Cache storage in LRU order (least recently used first): {key: (value, expiry_timestamp)}
+# Keys are any hashable values (strings or tuples)
+_cache: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
 _default_ttl = 300  # 5 minutes default TTL
+_max_size = 10_000  # Maximum number of entries, least recently used are evicted first
 
+# Expiry index: min-heap of (expiry_timestamp, sequence, key)
+# Entries are deleted lazily - a heap entry is ignored if the key was overwritten or removed
+_expiry_heap: List[Tuple[float, int, Hashable]] = []
+_heap_sequence = itertools.count()
 
-def get(key: str) -> Optional[Any]:
+# In-flight computations for @cached and @single_flight: {key: future}
+# Concurrent callers for the same key await one computation instead of repeating it
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+# Guards mutations of _cache and _expiry_heap; reads (hit/miss lookups) stay lock-free
+_write_lock = threading.Lock()
+
+
+def _purge_expired() -> None:
+    """Remove expired entries using the expiry heap (amortized O(log n) per entry)"""
+    now = time.time()
+    if not _expiry_heap or _expiry_heap[0][0] >= now:
+        return
+    
+    with _write_lock:
+        while _expiry_heap and _expiry_heap[0][0] < now:
+            expiry, _, key = heapq.heappop(_expiry_heap)
+            entry = _cache.get(key)
+            # Skip stale heap entries: key was overwritten with a new expiry or already removed
+            if entry is not None and entry[1] == expiry:
+                del _cache[key]
+
+
+def get(key: Hashable) -> Optional[Any]:
     """
     Get value from cache if it exists and hasn't expired
     
@@ -23,22 +57,31 @@ def get(key: str) -> Optional[Any]:
     Returns:
         Cached value or None if not found/expired
     """
-    if key not in _cache:
+    _purge_expired()
+    
+    entry = _cache.get(key)
+    if entry is None:
         return None
     
-    value, expiry = _cache[key]
+    value, expiry = entry
     
     if time.time() > expiry:
         # Expired, remove from cache
-        del _cache[key]
-        logger.debug(f"Cache expired for key: {key}")
+        with _write_lock:
+            _cache.pop(key, None)
+        logger.debug("Cache expired for key: %s", key)
         return None
     
-    logger.debug(f"Cache hit for key: {key}")
+    try:
+        _cache.move_to_end(key)
+    except KeyError:
+        # Evicted by a concurrent writer after the lookup; value is still valid to return
+        pass
+    logger.debug("Cache hit for key: %s", key)
     return value
 
 
-def set(key: str, value: Any, ttl: int = None) -> None:
+def set(key: Hashable, value: Any, ttl: int = None) -> None:
     """
     Store value in cache with TTL
     
@@ -50,24 +93,87 @@ def set(key: str, value: Any, ttl: int = None) -> None:
     if ttl is None:
         ttl = _default_ttl
     
+    _purge_expired()
+    
     expiry = time.time() + ttl
-    _cache[key] = (value, expiry)
-    logger.debug(f"Cached key: {key} with TTL: {ttl}s")
+    with _write_lock:
+        _cache[key] = (value, expiry)
+        _cache.move_to_end(key)
+        heapq.heappush(_expiry_heap, (expiry, next(_heap_sequence), key))
+        
+        while len(_cache) > _max_size:
+            evicted_key, _ = _cache.popitem(last=False)
+            logger.debug("Cache full, evicted key: %s", evicted_key)
+    logger.debug("Cached key: %s with TTL: %ss", key, ttl)
 
 
-def clear(key: str = None) -> None:
+def clear(key: Hashable = None) -> None:
     """
     Clear cache entry or all cache
     
     Args:
         key: Cache key to clear, or None to clear all
     """
-    if key is None:
-        _cache.clear()
-        logger.debug("Cache cleared")
-    elif key in _cache:
-        del _cache[key]
-        logger.debug(f"Cache cleared for key: {key}")
+    with _write_lock:
+        if key is None:
+            _cache.clear()
+            _expiry_heap.clear()
+            logger.debug("Cache cleared")
+        elif _cache.pop(key, None) is not None:
+            logger.debug("Cache cleared for key: %s", key)
+
+
+def _make_key(key_prefix: str, func, args: tuple, kwargs: dict) -> Hashable:
+    """Build cache key from function and its arguments"""
+    # Tuple key: no string formatting, hashing combines element hashes
+    return (
+        key_prefix,
+        func.__module__,
+        func.__name__,
+        args,
+        tuple(sorted(kwargs.items())) if kwargs else ()
+    )
+
+
+async def _run_once(key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run computation for key, or wait for the one already in flight
+    
+    Args:
+        key: In-flight key
+        compute: Coroutine function producing the result
+        
+    Returns:
+        Result of the computation (shared by all concurrent callers)
+    """
+    # Another coroutine is already computing this key - wait for its result
+    future = _inflight.get(key)
+    while future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # This waiter itself was cancelled
+                raise
+        # The computing coroutine was cancelled - retry instead of failing its waiters
+        future = _inflight.get(key)
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await compute()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark exception as retrieved when nobody else is waiting
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
 
 
 def cached(ttl: int = None, key_prefix: str = ""):
@@ -86,19 +192,42 @@ def cached(ttl: int = None, key_prefix: str = ""):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Create cache key from function name and arguments
-            cache_key = f"{key_prefix}{func.__name__}:{str(args)}:{str(sorted(kwargs.items()))}"
+            cache_key = _make_key(key_prefix, func, args, kwargs)
             
             # Try to get from cache
             cached_value = get(cache_key)
             if cached_value is not None:
                 return cached_value
             
-            # Call function and cache result
-            result = await func(*args, **kwargs)
-            set(cache_key, result, ttl)
+            async def compute():
+                # Call function and cache result
+                result = await func(*args, **kwargs)
+                set(cache_key, result, ttl)
+                return result
             
-            return result
+            return await _run_once(cache_key, compute)
+        
+        return wrapper
+    return decorator
+
+
+def single_flight(key_prefix: str = ""):
+    """
+    Decorator to coalesce concurrent calls with the same arguments (results are not cached)
+    
+    Args:
+        key_prefix: Prefix for in-flight key
+        
+    Usage:
+        @single_flight(key_prefix="poll")
+        async def my_function(arg1, arg2):
+            ...
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = _make_key(key_prefix, func, args, kwargs)
+            return await _run_once(key, lambda: func(*args, **kwargs))
         
         return wrapper
     return decorator
@@ -106,14 +235,13 @@ def cached(ttl: int = None, key_prefix: str = ""):
 
 def get_cache_stats() -> Dict[str, Any]:
     """Get cache statistics"""
-    current_time = time.time()
-    valid_count = sum(1 for _, expiry in _cache.values() if current_time <= expiry)
-    expired_count = len(_cache) - valid_count
+    # Expired entries are purged via the expiry heap, so every remaining key is valid
+    _purge_expired()
     
     return {
         "total_keys": len(_cache),
-        "valid_keys": valid_count,
-        "expired_keys": expired_count,
-        "max_size": None  # No limit currently
+        "valid_keys": len(_cache),
+        "expired_keys": 0,
+        "max_size": _max_size
     }
 
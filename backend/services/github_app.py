@@ -4,17 +4,48 @@ Based on: https://stackoverflow.com/questions/74892481/how-to-authenticate-a-git
 """
 import os
 import time
+import logging
+import hashlib
+import functools
 import jwt
-import httpx
+import orjson
+from datetime import datetime
 from pathlib import Path
+from cryptography.hazmat.primitives import serialization
+from typing import Dict, Optional, Tuple
+from backend.services.cache import single_flight
+from backend.services.http_client import get_client, send_with_retry, fingerprint, GITHUB_JSON_HEADERS
 
+logger = logging.getLogger(__name__)
 
-def load_private_key(key_path: str = None) -> str:
+# JWT lifetime in seconds (GitHub allows at most 10 minutes; 9 leaves room for clock skew)
+JWT_LIFETIME = 540
+# Generate a new JWT when the cached one expires in less than this many seconds
+JWT_REFRESH_MARGIN = 60
+
+# Signed JWT cache: {(app_id, private_key_fingerprint): (token, expiry_timestamp)}
+_jwt_cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+# Installation tokens live 1 hour; request a new one when less than this many seconds remain
+INSTALLATION_TOKEN_REFRESH_MARGIN = 600
+# Fallback lifetime when GitHub response has no expires_at
+INSTALLATION_TOKEN_LIFETIME = 3600
+
+# Installation token cache: {(app_id, installation_id): (token, expiry_timestamp)}
+_installation_token_cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+# GitHub App slug never changes for an App ID: {app_id: slug}
+_app_slug_cache: Dict[str, str] = {}
+
+
+@functools.lru_cache(maxsize=4)
+def _read_pem(key_path: str = None, mtime_ns: int = None) -> str:
     """
-    Load GitHub App private key from file or environment variable
+    Read private key from file or environment variable (cached)
     
     Args:
         key_path: Path to private key file
+        mtime_ns: File modification time - part of the cache key, so a replaced file is re-read
         
     Returns:
         Private key content as string
@@ -31,6 +62,54 @@ def load_private_key(key_path: str = None) -> str:
     raise ValueError("GitHub App private key not found. Set GITHUB_APP_PRIVATE_KEY_PATH or GITHUB_APP_PRIVATE_KEY")
 
 
+def load_private_key(key_path: str = None) -> str:
+    """
+    Load GitHub App private key from file or environment variable
+    
+    Args:
+        key_path: Path to private key file
+        
+    Returns:
+        Private key content as string
+    """
+    try:
+        mtime_ns = os.stat(key_path).st_mtime_ns if key_path else None
+    except OSError:
+        mtime_ns = None
+    return _read_pem(key_path, mtime_ns)
+
+
+@functools.lru_cache(maxsize=1)
+def get_app_credentials() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Read GitHub App settings from environment variables (once, on first use)
+    
+    Read lazily rather than at import time: app.py loads .env after importing routes.
+    
+    Returns:
+        Tuple (GITHUB_APP_ID, GITHUB_APP_INSTALLATION_ID, GITHUB_APP_PRIVATE_KEY_PATH)
+    """
+    return (
+        os.getenv("GITHUB_APP_ID"),
+        os.getenv("GITHUB_APP_INSTALLATION_ID"),
+        os.getenv("GITHUB_APP_PRIVATE_KEY_PATH")
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _load_key(pem: str):
+    """
+    Parse PEM private key into a key object (cached, PEM parsing is expensive)
+    
+    Args:
+        pem: Private key content (PEM format)
+        
+    Returns:
+        Private key object usable by PyJWT
+    """
+    return serialization.load_pem_private_key(pem.encode(), password=None)
+
+
 def generate_jwt(app_id: str, private_key: str) -> str:
     """
     Generate JWT token for GitHub App authentication
@@ -42,9 +121,6 @@ def generate_jwt(app_id: str, private_key: str) -> str:
     Returns:
         JWT token string
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     now = int(time.time())
     
     # Ensure app_id is a string (GitHub expects it as string in JWT)
@@ -52,7 +128,7 @@ def generate_jwt(app_id: str, private_key: str) -> str:
     
     payload = {
         "iat": now - 60,  # Issued at time (60 seconds in the past to allow for clock skew)
-        "exp": now + 600,  # Expiration time (10 minutes in the future)
+        "exp": now + JWT_LIFETIME,  # Expiration time (9 minutes in the future)
         "iss": app_id_str  # Issuer (GitHub App ID as string)
     }
     
@@ -64,18 +140,44 @@ def generate_jwt(app_id: str, private_key: str) -> str:
         if not private_key_clean.endswith('\n'):
             private_key_clean += '\n'
         
-        logger.debug(f"Generating JWT for App ID: {app_id_str}, key length: {len(private_key_clean)}")
-        token = jwt.encode(payload, private_key_clean, algorithm="RS256")
-        logger.debug(f"JWT generated successfully, token length: {len(token)}")
+        # Reuse previously signed JWT while it is still valid (RS256 signing is CPU-expensive)
+        key_fingerprint = hashlib.sha256(private_key_clean.encode()).hexdigest()[:16]
+        cache_key = (app_id_str, key_fingerprint)
+        cached = _jwt_cache.get(cache_key)
+        if cached and cached[1] - now > JWT_REFRESH_MARGIN:
+            return cached[0]
+        
+        logger.debug("Generating JWT for App ID: %s, key length: %s", app_id_str, len(private_key_clean))
+        token = jwt.encode(payload, _load_key(private_key_clean), algorithm="RS256")
+        _jwt_cache[cache_key] = (token, now + JWT_LIFETIME)
+        logger.debug("JWT generated successfully, token length: %s", len(token))
         return token
     except Exception as e:
-        logger.error(f"Failed to generate JWT: {str(e)}", exc_info=True)
+        logger.error("Failed to generate JWT: %s", e, exc_info=True)
         raise
 
 
+def _parse_expires_at(value: str) -> float:
+    """
+    Parse GitHub expires_at timestamp (e.g. "2016-07-11T22:14:10Z")
+    
+    Args:
+        value: ISO 8601 timestamp or None
+        
+    Returns:
+        Unix timestamp of expiry
+    """
+    if value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return time.time() + INSTALLATION_TOKEN_LIFETIME
+
+
 async def get_installation_token(app_id: str, installation_id: str, private_key: str) -> str:
     """
-    Get installation access token from GitHub API
+    Get installation access token (cached until shortly before it expires)
     
     Args:
         app_id: GitHub App ID
@@ -85,38 +187,145 @@ async def get_installation_token(app_id: str, installation_id: str, private_key:
     Returns:
         Installation access token
     """
-    import logging
-    logger = logging.getLogger(__name__)
+    cache_key = (str(app_id), str(installation_id))
+    
+    cached = _installation_token_cache.get(cache_key)
+    if cached and cached[1] - time.time() > INSTALLATION_TOKEN_REFRESH_MARGIN:
+        return cached[0]
+    
+    return await _refresh_installation_token(*cache_key, private_key)
+
+
+@single_flight(key_prefix="installation_token")
+async def _refresh_installation_token(app_id: str, installation_id: str, private_key: str) -> str:
+    """
+    Request installation token and cache it; concurrent refreshes share one request
     
+    Args:
+        app_id: GitHub App ID
+        installation_id: Installation ID
+        private_key: Private key content (PEM format)
+        
+    Returns:
+        Installation access token
+    """
+    token, expires_at = await _request_installation_token(app_id, installation_id, private_key)
+    _installation_token_cache[(app_id, installation_id)] = (token, expires_at)
+    return token
+
+
+async def _request_installation_token(app_id: str, installation_id: str, private_key: str) -> Tuple[str, float]:
+    """
+    Request new installation access token from GitHub API
+    
+    Args:
+        app_id: GitHub App ID
+        installation_id: Installation ID
+        private_key: Private key content (PEM format)
+        
+    Returns:
+        Tuple (installation access token, expiry timestamp)
+    """
     try:
         # Generate JWT
-        logger.info(f"Generating JWT for App ID: {app_id}, Installation ID: {installation_id}")
+        logger.info("Generating JWT for App ID: %s, Installation ID: %s", app_id, installation_id)
         jwt_token = generate_jwt(app_id, private_key)
-        logger.debug(f"JWT token generated: {jwt_token[:50]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("JWT token generated: fingerprint=%s", fingerprint(jwt_token))
         
         # Request installation token
         url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
         headers = {
             "Authorization": f"Bearer {jwt_token}",
-            "Accept": "application/vnd.github.v3+json"
+            **GITHUB_JSON_HEADERS
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers)
-            if response.status_code != 201:
-                error_text = response.text
-                logger.error(f"Failed to get installation token: {response.status_code} - {error_text}")
-                try:
-                    error_json = response.json()
-                    error_msg = error_json.get("message", error_text)
-                    logger.error(f"GitHub API error: {error_msg}")
-                except:
-                    pass
-                response.raise_for_status()
-            data = response.json()
-            logger.info("Installation token obtained successfully")
-            return data["token"]
+        client = get_client()
+        # Minting a token twice is harmless, so the POST is retried like a GET
+        response = await send_with_retry(lambda: client.post(url, headers=headers))
+        if response.status_code != 201:
+            error_text = response.text
+            logger.error("Failed to get installation token: %s - %s", response.status_code, error_text)
+            try:
+                error_json = response.json()
+                error_msg = error_json.get("message", error_text)
+                logger.error("GitHub API error: %s", error_msg)
+            except (ValueError, AttributeError):
+                # Body is not JSON or not a JSON object
+                pass
+            response.raise_for_status()
+        data = orjson.loads(response.content)
+        logger.info("Installation token obtained successfully")
+        return data["token"], _parse_expires_at(data.get("expires_at"))
     except Exception as e:
-        logger.error(f"Error getting installation token: {str(e)}", exc_info=True)
+        logger.error("Error getting installation token: %s", e, exc_info=True)
         raise
 
+
+
+async def get_app_slug(app_id: str, private_key: str = None) -> Optional[str]:
+    """
+    Get GitHub App slug (fetched from /app once per process)
+    
+    Args:
+        app_id: GitHub App ID
+        private_key: Private key content (PEM format); loaded from configuration
+            only when the slug is not cached yet
+        
+    Returns:
+        App slug (e.g. "github-action-executor") or None if it could not be fetched
+    """
+    app_slug = _app_slug_cache.get(app_id)
+    if app_slug:
+        return app_slug
+    
+    if private_key is None:
+        private_key = load_private_key(get_app_credentials()[2])
+    return await _fetch_app_slug(app_id, private_key)
+
+
+@single_flight(key_prefix="app_slug")
+async def _fetch_app_slug(app_id: str, private_key: str) -> Optional[str]:
+    """
+    Fetch GitHub App slug from /app and cache it; concurrent lookups share one request
+    
+    Args:
+        app_id: GitHub App ID
+        private_key: Private key content (PEM format)
+        
+    Returns:
+        App slug or None if it could not be fetched
+    """
+    headers = {
+        "Authorization": f"Bearer {generate_jwt(app_id, private_key)}",
+        **GITHUB_JSON_HEADERS
+    }
+    try:
+        client = get_client()
+        response = await send_with_retry(lambda: client.get("https://api.github.com/app", headers=headers))
+        if response.status_code == 200:
+            app_slug = orjson.loads(response.content).get("slug")
+            if app_slug:
+                _app_slug_cache[app_id] = app_slug
+            return app_slug
+        logger.warning("Failed to get GitHub App info: %s", response.status_code)
+    except Exception as e:
+        logger.warning("Failed to get GitHub App info: %s", e)
+    return None
+
+
+async def get_app_installation_token() -> str:
+    """
+    Get installation token for the GitHub App configured via environment variables
+    (GITHUB_APP_ID, GITHUB_APP_INSTALLATION_ID, GITHUB_APP_PRIVATE_KEY_PATH / GITHUB_APP_PRIVATE_KEY)
+    
+    Returns:
+        Installation access token (cached until shortly before it expires)
+    """
+    app_id, installation_id, private_key_path = get_app_credentials()
+    
+    if not all([app_id, installation_id]):
+        raise ValueError("GITHUB_APP_ID and GITHUB_APP_INSTALLATION_ID must be set")
+    
+    private_key = load_private_key(private_key_path)
+    return await get_installation_token(app_id, installation_id, private_key)
@@ -4,8 +4,10 @@ GitHub OAuth service for user authentication
 import os
 import logging
 import httpx
+import orjson
 from urllib.parse import urlencode
 import config
+from backend.services.http_client import get_client, conditional_get, fingerprint, GITHUB_JSON_HEADERS
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +16,9 @@ GITHUB_AUTH_URL = "https://github.com/login/oauth/authorize"
 GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
 GITHUB_API_URL = "https://api.github.com/user"
 
+# Token exchange endpoint returns form-encoded data unless JSON is requested
+TOKEN_REQUEST_HEADERS = {"Accept": "application/json"}
+
 
 def get_oauth_url(state: str = None) -> str:
     """
@@ -67,7 +72,7 @@ async def get_access_token(code: str) -> str:
         logger.error("GITHUB_CLIENT_SECRET is not set")
         raise ValueError("GITHUB_CLIENT_SECRET is not set")
     
-    logger.info(f"Exchanging code for token - Client ID: {client_id[:10]}..., Callback: {callback_url}")
+    logger.info("Exchanging code for token - Client ID: %s..., Callback: %s", client_id[:10], callback_url)
     
     data = {
         "client_id": client_id,
@@ -76,43 +81,42 @@ async def get_access_token(code: str) -> str:
         "redirect_uri": callback_url
     }
     
-    headers = {
-        "Accept": "application/json"
-    }
+    headers = TOKEN_REQUEST_HEADERS
     
     try:
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"POST to {GITHUB_TOKEN_URL} with data: client_id={client_id[:10]}..., code={code[:10]}...")
-            response = await client.post(GITHUB_TOKEN_URL, data=data, headers=headers)
-            
-            logger.info(f"GitHub token response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"GitHub API error ({response.status_code}): {error_text}")
-                try:
-                    error_json = response.json()
-                    error_msg = error_json.get("error_description", error_json.get("error", error_text))
-                    raise ValueError(f"GitHub API error: {error_msg}")
-                except:
-                    raise ValueError(f"GitHub API error ({response.status_code}): {error_text}")
-            
-            result = response.json()
-            logger.debug(f"GitHub response keys: {list(result.keys())}")
-            
-            if "access_token" not in result:
-                error_msg = result.get("error_description", result.get("error", "Unknown error"))
-                logger.error(f"GitHub did not return access_token: {error_msg}")
-                logger.error(f"Full response: {result}")
-                raise ValueError(f"GitHub did not return access_token: {error_msg}")
-            
-            logger.info("Access token obtained successfully")
-            return result["access_token"]
+        client = get_client()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("POST to %s with data: client_id=%s..., code fingerprint=%s", GITHUB_TOKEN_URL, client_id[:10], fingerprint(code))
+        response = await client.post(GITHUB_TOKEN_URL, data=data, headers=headers)
+        
+        logger.info("GitHub token response status: %s", response.status_code)
+        
+        if response.status_code != 200:
+            error_text = response.text
+            logger.error("GitHub API error (%s): %s", response.status_code, error_text)
+            try:
+                error_json = response.json()
+                error_msg = error_json.get("error_description", error_json.get("error", error_text))
+                raise ValueError(f"GitHub API error: {error_msg}")
+            except:
+                raise ValueError(f"GitHub API error ({response.status_code}): {error_text}")
+        
+        result = orjson.loads(response.content)
+        logger.debug("GitHub response keys: %s", list(result.keys()))
+        
+        if "access_token" not in result:
+            error_msg = result.get("error_description", result.get("error", "Unknown error"))
+            logger.error("GitHub did not return access_token: %s", error_msg)
+            logger.error("Full response: %s", result)
+            raise ValueError(f"GitHub did not return access_token: {error_msg}")
+        
+        logger.info("Access token obtained successfully")
+        return result["access_token"]
     except httpx.HTTPError as e:
-        logger.error(f"HTTP error while exchanging code for token: {str(e)}", exc_info=True)
+        logger.error("HTTP error while exchanging code for token: %s", e, exc_info=True)
         raise ValueError(f"HTTP error: {str(e)}")
     except Exception as e:
-        logger.error(f"Unexpected error while exchanging code for token: {str(e)}", exc_info=True)
+        logger.error("Unexpected error while exchanging code for token: %s", e, exc_info=True)
         raise
 
 
@@ -128,25 +132,25 @@ async def get_user_info(access_token: str) -> dict:
     """
     headers = {
         "Authorization": f"token {access_token}",
-        "Accept": "application/vnd.github.v3+json"
+        **GITHUB_JSON_HEADERS
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"GET {GITHUB_API_URL} with token: {access_token[:10]}...")
-            response = await client.get(GITHUB_API_URL, headers=headers)
-            
-            if response.status_code != 200:
-                logger.error(f"GitHub API error getting user info: {response.status_code} - {response.text}")
-                response.raise_for_status()
-            
-            user_info = response.json()
-            logger.info(f"User info retrieved: login={user_info.get('login')}, id={user_info.get('id')}")
-            return user_info
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GET %s with token fingerprint: %s", GITHUB_API_URL, fingerprint(access_token))
+        response = await conditional_get(GITHUB_API_URL, headers)
+        
+        if response.status_code != 200:
+            logger.error("GitHub API error getting user info: %s - %s", response.status_code, response.text)
+            response.raise_for_status()
+        
+        user_info = orjson.loads(response.content)
+        logger.info("User info retrieved: login=%s, id=%s", user_info.get('login'), user_info.get('id'))
+        return user_info
     except httpx.HTTPError as e:
-        logger.error(f"HTTP error while getting user info: {str(e)}", exc_info=True)
+        logger.error("HTTP error while getting user info: %s", e, exc_info=True)
         raise
     except Exception as e:
-        logger.error(f"Unexpected error while getting user info: {str(e)}", exc_info=True)
+        logger.error("Unexpected error while getting user info: %s", e, exc_info=True)
         raise
 
@@ -0,0 +1,219 @@
+"""
+Shared HTTP client for GitHub API calls
+Reuses keep-alive connections instead of opening a new TCP+TLS session per request
+"""
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from backend.services.cache import get as cache_get, set as cache_set
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 50
+# Idle connections are kept open this long (httpx default is 5s), so DNS lookup and
+# TLS handshake for api.github.com happen only on genuinely cold connections
+KEEPALIVE_EXPIRY = 120.0
+REQUEST_TIMEOUT = 10.0
+# Fail fast when api.github.com is unreachable instead of waiting the full request timeout
+CONNECT_TIMEOUT = 5.0
+
+# Accept header for GitHub REST API v3 requests (only Authorization varies per request)
+GITHUB_JSON_HEADERS = {"Accept": "application/vnd.github.v3+json"}
+
+# How long a stored ETag and its response are kept for revalidation (1 hour)
+ETAG_CACHE_TTL = 3600
+
+# Retry settings for transient GitHub errors (5xx, network errors, rate limiting)
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_JITTER = 0.5
+# Longer waits (e.g. rate limit resets in 20 minutes) are not worth holding the request
+RETRY_MAX_DELAY = 30.0
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get shared AsyncClient (created lazily on first use)
+    
+    Returns:
+        Process-wide httpx.AsyncClient with HTTP/2 and connection pooling
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+        logger.debug("Created shared HTTP client")
+    return _client
+
+
+async def close_client() -> None:
+    """Close shared AsyncClient (called on application shutdown)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.debug("Closed shared HTTP client")
+    _client = None
+
+
+def fingerprint(value: str) -> str:
+    """
+    Short stable fingerprint of a secret (token), safe to use in cache keys
+    
+    Args:
+        value: Secret value
+    
+    Returns:
+        Hex digest (16 characters)
+    """
+    return hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+def rate_limit_wait(response: httpx.Response) -> Optional[float]:
+    """
+    Seconds to wait before retrying a rate-limited response
+    
+    Args:
+        response: Response with status 403 or 429
+        
+    Returns:
+        Wait time in seconds, or None if the response is not a rate limit error
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return max(float(response.headers.get("X-RateLimit-Reset", "")) - time.time(), 0.0)
+        except ValueError:
+            pass
+    if response.status_code == 429:
+        return 0.0
+    return None
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    """
+    Check whether response is a rate limit error (403/429 with rate limit headers)
+    
+    Args:
+        response: GitHub API response
+        
+    Returns:
+        True if the request was rejected by the rate limit, not by permissions
+    """
+    return response.status_code in (403, 429) and rate_limit_wait(response) is not None
+
+
+async def send_with_retry(
+    send: Callable[[], Awaitable[httpx.Response]],
+    idempotent: bool = True,
+    max_retries: int = MAX_RETRIES
+) -> httpx.Response:
+    """
+    Send request, retrying transient failures with exponential backoff and jitter
+    
+    Rate-limited responses (403/429 with Retry-After or exhausted X-RateLimit-Remaining)
+    are retried after the advertised wait. 5xx responses and network errors are retried
+    only for idempotent requests - a non-idempotent POST may already have been processed.
+    Other 4xx responses are returned immediately.
+    
+    Args:
+        send: Coroutine function performing the request
+        idempotent: Whether the request is safe to repeat after 5xx or network errors
+        max_retries: Maximum number of retries
+    
+    Returns:
+        httpx.Response (the last one if retries were exhausted)
+    """
+    # For non-idempotent requests only errors where the request never reached GitHub are safe to retry
+    retryable_errors = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
+    
+    attempt = 0
+    while True:
+        backoff = min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY) * (1 + random.uniform(0, RETRY_JITTER))
+        try:
+            response = await send()
+        except retryable_errors as e:
+            if attempt >= max_retries:
+                raise
+            logger.warning("GitHub request failed (%s), retrying in %.1fs", e, backoff)
+        else:
+            if response.status_code in (403, 429):
+                wait = rate_limit_wait(response)
+                if wait is None or attempt >= max_retries or wait > RETRY_MAX_DELAY:
+                    return response
+                backoff = max(wait, backoff)
+                logger.warning("GitHub rate limit hit, retrying in %.1fs", backoff)
+            elif response.status_code >= 500 and idempotent and attempt < max_retries:
+                logger.warning("GitHub returned %s, retrying in %.1fs", response.status_code, backoff)
+            else:
+                return response
+        
+        await asyncio.sleep(backoff)
+        attempt += 1
+
+
+async def conditional_get(url: str, headers: dict, params: dict = None) -> httpx.Response:
+    """
+    GET request with ETag revalidation
+    
+    If a previous 200 response for the same URL, params, media type and credentials had an ETag,
+    sends If-None-Match. On 304 Not Modified returns the stored response
+    (GitHub does not count 304 responses against the rate limit).
+    
+    Args:
+        url: Request URL
+        headers: Request headers (including Authorization)
+        params: Optional query parameters
+    
+    Returns:
+        httpx.Response (the stored 200 response when GitHub answered 304)
+    """
+    cache_key = (
+        "etag",
+        url,
+        tuple(sorted((params or {}).items())),
+        headers.get("Accept"),
+        fingerprint(headers.get("Authorization", ""))
+    )
+    cached = cache_get(cache_key)
+    
+    request_headers = headers
+    if cached is not None:
+        request_headers = {**headers, "If-None-Match": cached[0]}
+    
+    client = get_client()
+    response = await send_with_retry(lambda: client.get(url, headers=request_headers, params=params))
+    
+    if response.status_code == 304 and cached is not None:
+        logger.debug("Not modified (304): %s", url)
+        # Refresh TTL of the stored response
+        cache_set(cache_key, cached, ETAG_CACHE_TTL)
+        return cached[1]
+    
+    if response.status_code == 200:
+        etag = response.headers.get("ETag")
+        if etag:
+            cache_set(cache_key, (etag, response), ETAG_CACHE_TTL)
+    
+    return response
@@ -3,9 +3,15 @@ Service for checking user permissions and collaborator access
 """
 import httpx
 import logging
+from backend.services.cache import get as cache_get, set as cache_set
+from backend.services.http_client import conditional_get, fingerprint, GITHUB_JSON_HEADERS, is_rate_limited
 
 logger = logging.getLogger(__name__)
 
+# TTLs for cached access check results (denials are re-checked sooner)
+ACCESS_GRANTED_TTL = 300
+ACCESS_DENIED_TTL = 60
+
 
 async def check_repository_access(owner: str, repo: str, access_token: str) -> bool:
     """
@@ -19,41 +25,55 @@ async def check_repository_access(owner: str, repo: str, access_token: str) -> b
     Returns:
         True if user has access, False otherwise
     """
+    # Token is hashed so plaintext tokens never end up in cache keys
+    cache_key = ("repo_access", fingerprint(access_token), owner, repo)
+    cached_result = cache_get(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
     url = f"https://api.github.com/repos/{owner}/{repo}"
     headers = {
         "Authorization": f"token {access_token}",
-        "Accept": "application/vnd.github.v3+json"
+        **GITHUB_JSON_HEADERS
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                logger.info(f"User HAS access to {owner}/{repo} (collaborator)")
-                return True
-            elif response.status_code == 401:
-                # Unauthorized - token invalid, expired, or insufficient permissions
-                logger.warning(f"Unauthorized access to {owner}/{repo}. Token may be invalid, expired, or lack required scopes.")
-                return False
-            elif response.status_code == 403:
-                # Forbidden - user doesn't have permission to access this repository
-                logger.warning(f"Forbidden: Cannot access {owner}/{repo}. User may not have repository access.")
-                return False
-            elif response.status_code == 404:
-                # Repository not found or no access
-                logger.warning(f"Repository {owner}/{repo} not found or no access")
-                return False
-            else:
-                logger.warning(f"Unexpected status code when checking repository access for {owner}/{repo}: {response.status_code}")
+        # Conditional request: unchanged repository answers 304 without using rate limit
+        response = await conditional_get(url, headers)
+        
+        if response.status_code == 200:
+            logger.info("User HAS access to %s/%s (collaborator)", owner, repo)
+            cache_set(cache_key, True, ACCESS_GRANTED_TTL)
+            return True
+        elif response.status_code == 401:
+            # Unauthorized - token invalid, expired, or insufficient permissions
+            logger.warning("Unauthorized access to %s/%s. Token may be invalid, expired, or lack required scopes.", owner, repo)
+            cache_set(cache_key, False, ACCESS_DENIED_TTL)
+            return False
+        elif response.status_code == 403:
+            if is_rate_limited(response):
+                # Rate limited - says nothing about access, so the result is not cached
+                logger.warning("Rate limited when checking repository access for %s/%s", owner, repo)
                 return False
+            # Forbidden - user doesn't have permission to access this repository
+            logger.warning("Forbidden: Cannot access %s/%s. User may not have repository access.", owner, repo)
+            cache_set(cache_key, False, ACCESS_DENIED_TTL)
+            return False
+        elif response.status_code == 404:
+            # Repository not found or no access
+            logger.warning("Repository %s/%s not found or no access", owner, repo)
+            cache_set(cache_key, False, ACCESS_DENIED_TTL)
+            return False
+        else:
+            logger.warning("Unexpected status code when checking repository access for %s/%s: %s", owner, repo, response.status_code)
+            return False
     except httpx.HTTPStatusError as e:
         if e.response.status_code in (401, 403, 404):
-            logger.warning(f"HTTP {e.response.status_code} when checking repository access for {owner}/{repo}: {e.response.text}")
+            logger.warning("HTTP %s when checking repository access for %s/%s: %s", e.response.status_code, owner, repo, e.response.text)
             return False
-        logger.error(f"HTTP error checking repository access for {owner}/{repo}: {e.response.status_code} - {e.response.text}")
+        logger.error("HTTP error checking repository access for %s/%s: %s - %s", owner, repo, e.response.status_code, e.response.text)
         return False
     except Exception as e:
-        logger.error(f"Error checking repository access for {owner}/{repo}: {str(e)}")
+        logger.error("Error checking repository access for %s/%s: %s", owner, repo, e)
         return False
 
@@ -1,15 +1,42 @@
 """
 Service for triggering GitHub Actions workflows
 """
-import os
+import re
+import time
+import random
 import asyncio
+import calendar
 import httpx
+import orjson
 import logging
 from datetime import datetime, timezone, timedelta
-from backend.services.github_app import get_installation_token, load_private_key, generate_jwt
+from backend.services.github_app import get_app_credentials, get_app_installation_token, get_app_slug
+from backend.services.cache import single_flight
+from backend.services.http_client import get_client, conditional_get, send_with_retry, GITHUB_JSON_HEADERS
 
 logger = logging.getLogger(__name__)
 
+# GitHub needs a moment to create the run after dispatch - earlier polls wait this long (seconds)
+MIN_RUN_AGE = 0.5
+# Runs list is filtered to the trigger time window, so only a handful of runs can match
+RUNS_PER_PAGE = 5
+
+# GitHub answers "Must have admin rights to Repository" on dispatch without Write permission
+_ADMIN_RIGHTS_RE = re.compile(r"admin\s+right", re.IGNORECASE)
+# Shown instead of that message
+_ADMIN_PERMISSION_HINT = (
+    "Insufficient permissions to trigger workflow.\n\n"
+    "GitHub API requires Write permission (or higher) in the repository to trigger workflows via API.\n"
+    "Note: The error message mentions 'admin rights', but Write permission is sufficient.\n\n"
+    "What to do:\n"
+    "1. Ensure you have Write (or higher) permission in repository {owner}/{repo}\n"
+    "2. If repository is in an organization, check organization settings:\n"
+    "   - Organization Settings → Policies → Actions → enable Actions\n"
+    "   - Organization Settings → Policies → Actions → Workflow permissions → Read and write\n"
+    "3. Check permissions: Repo → Settings → Collaborators & teams\n\n"
+    "Alternative: Set USE_USER_TOKEN_FOR_WORKFLOWS=false to use GitHub App account instead"
+)
+
 
 async def trigger_workflow(
     owner: str,
@@ -37,26 +64,16 @@ async def trigger_workflow(
     # Use user token if provided, otherwise use GitHub App
     if user_token:
         auth_token = user_token
-        logger.info(f"Triggering workflow {owner}/{repo}/{workflow_id} as authenticated user")
+        logger.info("Triggering workflow %s/%s/%s as authenticated user", owner, repo, workflow_id)
     else:
-        # Get GitHub App credentials
-        app_id = os.getenv("GITHUB_APP_ID")
-        installation_id = os.getenv("GITHUB_APP_INSTALLATION_ID")
-        private_key_path = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH")
-        
-        if not all([app_id, installation_id]):
-            raise ValueError("GITHUB_APP_ID and GITHUB_APP_INSTALLATION_ID must be set")
-        
-        # Load private key and get installation token
-        private_key = load_private_key(private_key_path)
-        auth_token = await get_installation_token(app_id, installation_id, private_key)
-        logger.info(f"Triggering workflow {owner}/{repo}/{workflow_id} as GitHub App")
+        auth_token = await get_app_installation_token()
+        logger.info("Triggering workflow %s/%s/%s as GitHub App", owner, repo, workflow_id)
     
     # Trigger workflow
     url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_id}/dispatches"
     headers = {
         "Authorization": f"token {auth_token}",
-        "Accept": "application/vnd.github.v3+json"
+        **GITHUB_JSON_HEADERS
     }
     
     payload = {
@@ -65,49 +82,44 @@ async def trigger_workflow(
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Запоминаем время перед запуском
-            trigger_time = datetime.now(timezone.utc)
-            
-            response = await client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            # GitHub API не возвращает run_id в ответе на POST /dispatches
-            # Возвращаем trigger_time, фронтенд будет опрашивать API для поиска run
-            return {
-                "success": True,
-                "status_code": response.status_code,
-                "message": "Workflow triggered successfully",
-                "trigger_time": trigger_time.isoformat(),
-                "workflow_url": f"https://github.com/{owner}/{repo}/actions/workflows/{workflow_id}"
-            }
+        client = get_client()
+        
+        # Запоминаем время перед запуском
+        trigger_time = datetime.now(timezone.utc)
+        
+        # Dispatch is not idempotent: retried only when rate-limited or the connection failed
+        response = await send_with_retry(
+            lambda: client.post(url, headers=headers, json=payload),
+            idempotent=False
+        )
+        response.raise_for_status()
+        
+        # GitHub API не возвращает run_id в ответе на POST /dispatches
+        # Возвращаем trigger_time, фронтенд будет опрашивать API для поиска run
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "message": "Workflow triggered successfully",
+            "trigger_time": trigger_time.isoformat(),
+            "workflow_url": f"https://github.com/{owner}/{repo}/actions/workflows/{workflow_id}"
+        }
     except httpx.HTTPStatusError as e:
         error_message = "Unknown error"
         user_friendly_message = None
         
         try:
-            error_data = e.response.json()
+            error_data = orjson.loads(e.response.content)
             error_message = error_data.get("message", str(e))
             
             # GitHub API returns "Must have admin rights to Repository", 
             # but actually Write permission is sufficient
-            if "admin" in error_message.lower() and "right" in error_message.lower():
-                user_friendly_message = (
-                    f"Insufficient permissions to trigger workflow.\n\n"
-                    f"GitHub API requires Write permission (or higher) in the repository to trigger workflows via API.\n"
-                    f"Note: The error message mentions 'admin rights', but Write permission is sufficient.\n\n"
-                    f"What to do:\n"
-                    f"1. Ensure you have Write (or higher) permission in repository {owner}/{repo}\n"
-                    f"2. If repository is in an organization, check organization settings:\n"
-                    f"   - Organization Settings → Policies → Actions → enable Actions\n"
-                    f"   - Organization Settings → Policies → Actions → Workflow permissions → Read and write\n"
-                    f"3. Check permissions: Repo → Settings → Collaborators & teams\n\n"
-                    f"Alternative: Set USE_USER_TOKEN_FOR_WORKFLOWS=false to use GitHub App account instead"
-                )
-        except:
+            if _ADMIN_RIGHTS_RE.search(error_message):
+                user_friendly_message = _ADMIN_PERMISSION_HINT.format(owner=owner, repo=repo)
+        except (ValueError, TypeError, AttributeError):
+            # Body is not JSON or has unexpected shape
             error_message = str(e)
         
-        logger.error(f"Failed to trigger workflow: {error_message} (status: {e.response.status_code})")
+        logger.error("Failed to trigger workflow: %s (status: %s)", error_message, e.response.status_code)
         
         # Используем понятное сообщение, если доступно, иначе оригинальное
         final_message = user_friendly_message if user_friendly_message else f"Failed to trigger workflow: {error_message}"
@@ -119,6 +131,37 @@ async def trigger_workflow(
         }
 
 
+def _parse_gh_ts(value: str) -> float:
+    """
+    Parse GitHub API timestamp into Unix time
+    
+    GitHub always uses fixed "YYYY-MM-DDTHH:MM:SSZ" layout, so fields are sliced
+    by offset instead of running the generic ISO 8601 parser.
+    
+    Args:
+        value: Timestamp string (e.g. "2024-01-15T10:30:00Z")
+        
+    Returns:
+        Unix timestamp (seconds, UTC)
+        
+    Raises:
+        ValueError: If the string does not have the expected layout
+    """
+    if len(value) != 20 or value[19] != 'Z':
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    return calendar.timegm((
+        int(value[0:4]), int(value[5:7]), int(value[8:10]),
+        int(value[11:13]), int(value[14:16]), int(value[17:19])
+    ))
+
+
+def _format_gh_ts(value: datetime) -> str:
+    """Format datetime as GitHub search timestamp (e.g. "2024-01-15T10:30:00Z")"""
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# Concurrent polls for the same run (several tabs, overlapping retries) share one GitHub lookup
+@single_flight(key_prefix="find_workflow_run")
 async def find_workflow_run(
     owner: str,
     repo: str,
@@ -143,132 +186,160 @@ async def find_workflow_run(
     Returns:
         Run data if found, None otherwise
     """
+    # Слишком ранний опрос: run ещё не создан, лучше подождать, чем тратить запрос впустую
+    trigger_age = (datetime.now(timezone.utc) - trigger_time).total_seconds()
+    if trigger_age < MIN_RUN_AGE:
+        # Не больше MIN_RUN_AGE, даже если trigger_time в будущем (расхождение часов)
+        await asyncio.sleep(min(MIN_RUN_AGE - trigger_age, MIN_RUN_AGE))
+    
     # Use user token if provided, otherwise use GitHub App
     if user_token:
         auth_token = user_token
-        logger.info(f"Searching for workflow run {owner}/{repo}/{workflow_id} triggered by user")
+        logger.info("Searching for workflow run %s/%s/%s triggered by user", owner, repo, workflow_id)
     else:
-        # Get GitHub App credentials
-        app_id = os.getenv("GITHUB_APP_ID")
-        installation_id = os.getenv("GITHUB_APP_INSTALLATION_ID")
-        private_key_path = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH")
-        
-        if not all([app_id, installation_id]):
-            raise ValueError("GITHUB_APP_ID and GITHUB_APP_INSTALLATION_ID must be set")
-        
-        # Load private key and get installation token
-        private_key = load_private_key(private_key_path)
-        auth_token = await get_installation_token(app_id, installation_id, private_key)
-        logger.info(f"Searching for workflow run {owner}/{repo}/{workflow_id} triggered by GitHub App")
+        auth_token = await get_app_installation_token()
+        logger.info("Searching for workflow run %s/%s/%s triggered by GitHub App", owner, repo, workflow_id)
     
     headers = {
         "Authorization": f"token {auth_token}",
-        "Accept": "application/vnd.github.v3+json"
+        **GITHUB_JSON_HEADERS
     }
     
-    async with httpx.AsyncClient() as client:
-        # Get app info to identify actor (only if using GitHub App)
-        app_slug = None
-        if not user_token:
-            app_id = os.getenv("GITHUB_APP_ID")
-            private_key_path = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH")
-            if app_id and private_key_path:
-                private_key = load_private_key(private_key_path)
-                app_url = f"https://api.github.com/app"
-                app_headers = {
-                    "Authorization": f"Bearer {generate_jwt(app_id, private_key)}",
-                    "Accept": "application/vnd.github.v3+json"
-                }
-                
-                try:
-                    app_response = await client.get(app_url, headers=app_headers)
-                    if app_response.status_code == 200:
-                        app_data = app_response.json()
-                        app_slug = app_data.get("slug")  # e.g., "github-action-executor"
-                except Exception:
-                    pass  # Если не удалось получить app info, будем искать по времени
+    # Определяем временное окно для поиска (от trigger_time до 30 секунд после)
+    time_window_start = trigger_time - timedelta(seconds=5)  # Небольшой запас назад
+    time_window_end = trigger_time + timedelta(seconds=30)   # Окно в будущее
+    
+    # Get workflow runs
+    runs_url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_id}/runs"
+    params = {
+        "per_page": RUNS_PER_PAGE,
+        # Only dispatched runs can be ours - let GitHub drop push/PR/schedule runs server-side
+        "event": "workflow_dispatch",
+        # Server-side time window: later runs can't push ours off the page, however old trigger_time is
+        "created": f"{_format_gh_ts(time_window_start)}..{_format_gh_ts(time_window_end)}",
+    }
+    if ref:
+        params["branch"] = ref
+    
+    # Get app info to identify actor (only if using GitHub App)
+    # App info and runs are independent - fetch them concurrently
+    # Runs list is polled repeatedly: conditional request answers 304 while nothing changed
+    app_id, _, private_key_path = get_app_credentials()
+    # Slug is cached after the first lookup, so only the first poll pays for /app
+    app_slug = None
+    if not user_token and app_id and private_key_path:
+        app_slug, runs_response = await asyncio.gather(
+            get_app_slug(app_id),
+            conditional_get(runs_url, headers, params)
+        )
+    else:
+        runs_response = await conditional_get(runs_url, headers, params)
+    runs_response.raise_for_status()
+    
+    runs_data = orjson.loads(runs_response.content)
+    workflow_runs = runs_data.get("workflow_runs", [])
+    
+    # Фильтруем runs по времени и другим критериям
+    # GitHub возвращает runs от новых к старым, поэтому первый подходящий run - самый свежий
+    
+    # Сравниваем Unix-время (float), без datetime-арифметики на каждый run
+    window_start_ts = time_window_start.timestamp()
+    window_end_ts = time_window_end.timestamp()
+    
+    # Логины, под которыми выступает наш GitHub App
+    app_logins = {app_slug, f"{app_slug}[bot]"} if app_slug else None
+    match_user = bool(user_token and expected_actor_login)
+    
+    for run in workflow_runs:
+        created_at_str = run.get("created_at")
+        if not created_at_str:
+            continue
+        try:
+            created_at = _parse_gh_ts(created_at_str)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.debug("Error parsing created_at for run: %s", e)
+            continue
         
-        # Get workflow runs
-        runs_url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_id}/runs"
-        params = {
-            "per_page": 20,
-        }
-        if ref:
-            params["branch"] = ref
+        # Runs отсортированы от новых к старым: дальше только более старые, совпадений не будет
+        if created_at < window_start_ts:
+            break
+        # Проверяем, что run создан в нашем временном окне
+        if created_at > window_end_ts:
+            continue
         
-        runs_response = await client.get(runs_url, headers=headers, params=params)
-        runs_response.raise_for_status()
+        # Проверяем ветку если указана
+        if ref and run.get("head_branch") != ref:
+            continue
         
-        runs_data = runs_response.json()
-        workflow_runs = runs_data.get("workflow_runs", [])
+        actor = run.get("actor") or {}
+        actor_login = actor.get("login", "")
+        actor_type = actor.get("type", "")
         
-        # Фильтруем runs по времени и другим критериям
-        # Ищем самый свежий run, созданный после trigger_time
-        candidate_runs = []
+        if match_user:
+            # Ищем run от имени пользователя
+            is_match = actor_login == expected_actor_login and actor_type == "User"
+        elif app_logins:
+            # Ищем run от имени GitHub App - проверяем по slug
+            is_match = actor_login in app_logins
+        else:
+            # slug неизвестен: GitHub Apps всегда имеют type="Bot",
+            # считаем что это наш запуск (вероятность другого бота в окне низкая)
+            is_match = actor_type == "Bot"
         
-        # Определяем временное окно для поиска (от trigger_time до 30 секунд после)
-        time_window_start = trigger_time - timedelta(seconds=5)  # Небольшой запас назад
-        time_window_end = trigger_time + timedelta(seconds=30)   # Окно в будущее
+        if is_match:
+            logger.info("Found workflow run: id=%s, url=%s, actor=%s", run.get('id'), run.get('html_url'), actor_login)
+            return run
+    
+    logger.warning("Workflow run not found for %s/%s/%s triggered at %s", owner, repo, workflow_id, trigger_time)
+    return None
+
+
+async def poll_for_workflow_run(
+    owner: str,
+    repo: str,
+    workflow_id: str,
+    trigger_time: datetime,
+    ref: str = None,
+    user_token: str = None,
+    expected_actor_login: str = None,
+    timeout: float = 3.0,
+    base_delay: float = 1.0,
+    max_delay: float = 8.0
+) -> dict:
+    """
+    Wait for workflow run to appear, retrying find_workflow_run with exponential backoff and jitter
+    
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        workflow_id: Workflow ID
+        trigger_time: When workflow was triggered (datetime object)
+        ref: Optional branch name to filter by
+        user_token: Optional user OAuth token
+        expected_actor_login: Optional expected actor login (username)
+        timeout: Total time to wait in seconds (short: each waiting request holds a worker connection)
+        base_delay: Delay before the second attempt in seconds
+        max_delay: Upper bound for delay between attempts in seconds
         
-        for run in workflow_runs:
-            actor = run.get("actor", {})
-            actor_login = actor.get("login", "")
-            actor_type = actor.get("type", "")
-            created_at_str = run.get("created_at")
-            run_ref = run.get("head_branch")
-            
-            # Проверяем ветку если указана
-            if ref and run_ref != ref:
-                continue
-            
-            if created_at_str:
-                try:
-                    created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-                    
-                    # Проверяем, что run создан в нашем временном окне
-                    if time_window_start <= created_at <= time_window_end:
-                        is_match = False
-                        
-                        if user_token and expected_actor_login:
-                            # Ищем run от имени пользователя
-                            if actor_login == expected_actor_login and actor_type == "User":
-                                is_match = True
-                                logger.debug(f"Found candidate user run: id={run.get('id')}, created_at={created_at_str}, actor={actor_login}")
-                        else:
-                            # Ищем run от имени GitHub App
-                            if app_slug:
-                                # Проверяем по slug
-                                if (actor_login == app_slug or 
-                                    actor_login == f"{app_slug}[bot]"):
-                                    is_match = True
-                            
-                            # Также проверяем по типу Bot
-                            # GitHub Apps всегда имеют type="Bot"
-                            if actor_type == "Bot":
-                                # Если app_slug не совпал, но это бот и время совпадает,
-                                # считаем что это наш запуск (вероятность другого бота низкая)
-                                if not app_slug or is_match:
-                                    is_match = True
-                            
-                            if is_match:
-                                logger.debug(f"Found candidate app run: id={run.get('id')}, created_at={created_at_str}, actor={actor_login}")
-                        
-                        if is_match:
-                            candidate_runs.append((created_at, run))
-                except (ValueError, AttributeError) as e:
-                    logger.debug(f"Error parsing created_at for run: {e}")
-                    pass
+    Returns:
+        Run data if found within timeout, None otherwise
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        run = await find_workflow_run(
+            owner, repo, workflow_id, trigger_time,
+            ref=ref,
+            user_token=user_token,
+            expected_actor_login=expected_actor_login
+        )
+        if run:
+            return run
         
-        # Если нашли подходящие runs, возвращаем самый свежий (самый поздний по времени)
-        if candidate_runs:
-            # Сортируем по времени создания (самый свежий первым)
-            candidate_runs.sort(key=lambda x: x[0], reverse=True)
-            _, best_run = candidate_runs[0]
-            run_id = best_run.get("id")
-            run_url = best_run.get("html_url")
-            logger.info(f"Found workflow run: id={run_id}, url={run_url}")
-            return best_run
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
         
-        logger.warning(f"Workflow run not found for {owner}/{repo}/{workflow_id} triggered at {trigger_time}")
-        return None
-
+        delay = min(max_delay, base_delay * 2 ** attempt) * (1 + random.uniform(0, 0.5))
+        await asyncio.sleep(min(delay, remaining))
+        attempt += 1
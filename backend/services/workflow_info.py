@@ -1,19 +1,261 @@
 """
 Service for getting workflow information from GitHub API
 """
-import os
-import base64
+import asyncio
 import logging
 import httpx
+import orjson
 import yaml
-from backend.services.github_app import get_installation_token, load_private_key
+from typing import Tuple
+from backend.services.cache import cached, get as cache_get, set as cache_set
+from backend.services.github_app import get_app_installation_token
+from backend.services.http_client import conditional_get, GITHUB_JSON_HEADERS
+
+try:
+    # libyaml-based loader is much faster than the pure-Python one
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
 
 logger = logging.getLogger(__name__)
 
+# Cache TTL in seconds - workflow files change rarely, the dispatch form loads them repeatedly
+CACHE_TTL = 60
+# Parsed inputs are keyed by file sha, so they can live long (1 hour)
+INPUTS_CACHE_TTL = 3600
+# Maximum concurrent GitHub lookups in get_workflows_info_bulk
+BULK_CONCURRENCY = 10
+# String defaults of boolean inputs that mean true (quoted YAML values stay strings)
+_TRUE_TOKENS = frozenset(("true", "1", "yes", "on"))
+
+
+def _normalize_input(input_config: dict) -> dict:
+    """
+    Normalize workflow_dispatch input definition from YAML
+    
+    Args:
+        input_config: Input definition (type, description, required, default, options)
+        
+    Returns:
+        Dictionary with type, description, required, default (and options for choice inputs)
+    """
+    get = input_config.get
+    input_type = get("type", "string")
+    default = get("default")
+    normalized = {
+        "type": input_type,
+        "description": get("description", ""),
+        "required": get("required", False),
+        "default": default
+    }
+    
+    match input_type:
+        case "choice":
+            # Для choice типа - сохраняем options
+            options = get("options", [])
+            normalized["options"] = options if isinstance(options, list) else []
+        case "boolean":
+            # Для boolean - конвертируем default в bool
+            if isinstance(default, str):
+                normalized["default"] = default.casefold() in _TRUE_TOKENS
+            elif not isinstance(default, bool):
+                normalized["default"] = bool(default)
+    
+    return normalized
+
 
+def _compose_event_node(loader, anchors: dict) -> yaml.Node:
+    """
+    Compose YAML node for the next value in the loader's event stream
+    
+    Args:
+        loader: YAML loader positioned at the start of a value
+        anchors: Anchors seen so far {anchor: node}
+        
+    Returns:
+        Composed yaml.Node (KeyError for an alias to an anchor outside the composed part)
+    """
+    event = loader.get_event()
+    if isinstance(event, yaml.AliasEvent):
+        return anchors[event.anchor]
+    
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        if event.anchor is not None:
+            anchors[event.anchor] = node
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        if event.anchor is not None:
+            anchors[event.anchor] = node
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose_event_node(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        if event.anchor is not None:
+            anchors[event.anchor] = node
+        while not loader.check_event(yaml.MappingEndEvent):
+            key_node = _compose_event_node(loader, anchors)
+            node.value.append((key_node, _compose_event_node(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    
+    return node
+
+
+def _skip_event_node(loader) -> None:
+    """Consume events of the next value without building it"""
+    event = loader.get_event()
+    if not isinstance(event, yaml.CollectionStartEvent):
+        return
+    depth = 1
+    while depth:
+        event = loader.get_event()
+        if isinstance(event, yaml.CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, yaml.CollectionEndEvent):
+            depth -= 1
+
+
+def _load_on_section(content: str):
+    """
+    Load only the top-level 'on' section of workflow YAML
+    
+    Walks the event stream, skips other top-level keys (jobs, env, ...) without
+    constructing them and stops right after the 'on' value.
+    
+    Args:
+        content: Workflow file content (YAML)
+        
+    Returns:
+        Python value of the 'on' section, or None if there is none
+    """
+    loader = YamlSafeLoader(content)
+    try:
+        loader.get_event()  # StreamStart
+        if not loader.check_event(yaml.DocumentStartEvent):
+            logger.warning("Workflow YAML is empty")
+            return None
+        loader.get_event()
+        if not loader.check_event(yaml.MappingStartEvent):
+            logger.warning("Workflow YAML is not a mapping")
+            return None
+        loader.get_event()
+        
+        while not loader.check_event(yaml.MappingEndEvent):
+            key_event = loader.peek_event()
+            # Plain 'on' (also 'On', 'ON', 'true', ...) resolves to boolean True in YAML 1.1,
+            # so match the raw scalar value the same way the full load would
+            if isinstance(key_event, yaml.ScalarEvent) and (
+                key_event.value == "on"
+                or (key_event.implicit[0] and key_event.value.casefold() in _TRUE_TOKENS)
+            ):
+                loader.get_event()
+                try:
+                    return loader.construct_document(_compose_event_node(loader, {}))
+                except KeyError:
+                    # Alias to an anchor defined in a skipped section - fall back to full load
+                    workflow_yaml = yaml.load(content, Loader=YamlSafeLoader)
+                    return workflow_yaml.get("on", workflow_yaml.get(True))
+            _skip_event_node(loader)  # key
+            _skip_event_node(loader)  # value
+        return None
+    finally:
+        loader.dispose()
+
+
+def _parse_workflow_inputs(content: str) -> Tuple[dict, bool]:
+    """
+    Extract workflow_dispatch inputs from workflow YAML
+    
+    Args:
+        content: Workflow file content (YAML)
+        
+    Returns:
+        Tuple (normalized inputs, whether workflow has workflow_dispatch trigger)
+    """
+    inputs = {}
+    has_workflow_dispatch = False
+    
+    # Parse YAML
+    # GitHub API не предоставляет inputs напрямую, поэтому парсим YAML вручную
+    # Это стандартный подход, так как inputs определены только в YAML файле
+    try:
+        # Only on.workflow_dispatch.inputs is needed - the rest of the file (jobs) is not constructed
+        on_section = _load_on_section(content)
+        
+        if on_section:
+            logger.debug("Workflow 'on' section type: %s, value: %s", type(on_section), on_section)
+            
+            workflow_dispatch = None
+            
+            # Если on - это словарь (наиболее частый случай)
+            if isinstance(on_section, dict):
+                if "workflow_dispatch" in on_section:
+                    workflow_dispatch = on_section["workflow_dispatch"]
+                    has_workflow_dispatch = True
+                    logger.debug("Found workflow_dispatch as dict key in 'on' section")
+            
+            # Если on - это список (редкий случай, но возможен)
+            elif isinstance(on_section, list):
+                for item in on_section:
+                    if isinstance(item, dict) and "workflow_dispatch" in item:
+                        workflow_dispatch = item["workflow_dispatch"]
+                        has_workflow_dispatch = True
+                        logger.debug("Found workflow_dispatch in list within 'on' section")
+                        break
+            
+            if workflow_dispatch:
+                if isinstance(workflow_dispatch, dict):
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Workflow dispatch keys: %s", list(workflow_dispatch.keys()))
+                    
+                    if "inputs" in workflow_dispatch:
+                        raw_inputs = workflow_dispatch["inputs"]
+                        if not isinstance(raw_inputs, dict):
+                            logger.warning("Inputs is not a dict: %s", type(raw_inputs))
+                        else:
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("Found %s inputs in workflow: %s", len(raw_inputs), list(raw_inputs.keys()))
+                            
+                            # Нормализуем inputs - сохраняем все поля из YAML
+                            inputs = {
+                                input_name: _normalize_input(input_config)
+                                for input_name, input_config in raw_inputs.items()
+                                if isinstance(input_config, dict)
+                            }
+                            if len(inputs) != len(raw_inputs):
+                                skipped = [name for name in raw_inputs if name not in inputs]
+                                logger.warning("Input configs are not dicts, skipping: %s", skipped)
+                    else:
+                        logger.debug("No 'inputs' key found in workflow_dispatch")
+                else:
+                    logger.warning("Workflow dispatch is not a dict: %s", type(workflow_dispatch))
+            else:
+                logger.debug("No 'workflow_dispatch' found in workflow 'on' section")
+        else:
+            logger.debug("No 'on' section found in workflow YAML")
+    except yaml.YAMLError as e:
+        logger.error("YAML parsing error: %s", e, exc_info=True)
+    except Exception as e:
+        logger.error("Failed to parse workflow YAML: %s", e, exc_info=True)
+    
+    return inputs, has_workflow_dispatch
+
+
+@cached(ttl=CACHE_TTL, key_prefix="workflow_info")
 async def get_workflow_info(owner: str, repo: str, workflow_id: str) -> dict:
     """
     Get workflow information including inputs from GitHub API
+    Results are cached; concurrent requests for the same workflow share one lookup.
     
     Args:
         owner: Repository owner
@@ -23,182 +265,90 @@ async def get_workflow_info(owner: str, repo: str, workflow_id: str) -> dict:
     Returns:
         Dictionary with workflow information including inputs
     """
-    # Get GitHub App credentials
-    app_id = os.getenv("GITHUB_APP_ID")
-    installation_id = os.getenv("GITHUB_APP_INSTALLATION_ID")
-    private_key_path = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH")
-    
-    if not all([app_id, installation_id]):
-        raise ValueError("GITHUB_APP_ID and GITHUB_APP_INSTALLATION_ID must be set")
-    
-    # Load private key and get installation token
-    private_key = load_private_key(private_key_path)
-    installation_token = await get_installation_token(app_id, installation_id, private_key)
+    installation_token = await get_app_installation_token()
     
     headers = {
         "Authorization": f"token {installation_token}",
-        "Accept": "application/vnd.github.v3+json"
+        **GITHUB_JSON_HEADERS
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Get workflow information
-            workflow_url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_id}"
-            response = await client.get(workflow_url, headers=headers)
-            
-            if response.status_code == 404:
-                logger.warning(f"Workflow {workflow_id} not found in {owner}/{repo}")
-                return {
-                    "found": False,
-                    "inputs": {},
-                    "has_workflow_dispatch": False
-                }
-            
-            response.raise_for_status()
-            workflow_data = response.json()
-            
-            # Get workflow file content to parse inputs
-            # GitHub API doesn't directly provide inputs, so we need to get the workflow file
-            workflow_path = workflow_data.get("path", f".github/workflows/{workflow_id}")
-            
-            # Try to get workflow file content
+        # Conditional requests: unchanged workflow and file answer 304 without using rate limit
+        workflow_url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_id}"
+        default_path = f".github/workflows/{workflow_id}"
+        
+        # Raw media type returns the YAML itself instead of a JSON envelope with base64 content
+        raw_headers = {**headers, "Accept": "application/vnd.github.raw"}
+        
+        file_response = None
+        if workflow_id.isdigit():
+            # Numeric workflow ID - file path is only known from metadata
+            response = await conditional_get(workflow_url, headers)
+        else:
+            # Workflow file name: the file almost always lives at the default path,
+            # so fetch metadata and contents concurrently instead of one after another
+            default_file_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{default_path}"
+            response, file_response = await asyncio.gather(
+                conditional_get(workflow_url, headers),
+                conditional_get(default_file_url, raw_headers),
+                return_exceptions=True
+            )
+            if isinstance(response, BaseException):
+                raise response
+        
+        if response.status_code == 404:
+            logger.warning("Workflow %s not found in %s/%s", workflow_id, owner, repo)
+            return {
+                "found": False,
+                "inputs": {},
+                "has_workflow_dispatch": False
+            }
+        
+        response.raise_for_status()
+        workflow_data = orjson.loads(response.content)
+        
+        # Get workflow file content to parse inputs
+        # GitHub API doesn't directly provide inputs, so we need to get the workflow file
+        workflow_path = workflow_data.get("path", default_path)
+        
+        # Speculative request missed (other path) or failed - fetch the actual file
+        if file_response is None or isinstance(file_response, BaseException) or workflow_path != default_path:
             file_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{workflow_path}"
-            file_response = await client.get(file_url, headers=headers)
+            file_response = await conditional_get(file_url, raw_headers)
+        
+        inputs = {}
+        has_workflow_dispatch = False
+        if file_response.status_code == 200:
+            logger.debug("Successfully retrieved workflow file content")
             
-            inputs = {}
-            has_workflow_dispatch = False
-            if file_response.status_code == 200:
-                logger.info(f"Successfully retrieved workflow file content")
-                file_data = file_response.json()
-                
-                # Decode file content
-                content = base64.b64decode(file_data["content"]).decode("utf-8")
-                logger.info(f"Workflow file content length: {len(content)} chars")
-                logger.info(f"First 1000 chars of content:\n{content[:1000]}")
+            # Parsed inputs are cached by file ETag (blob sha): a new commit changes it, so entries never go stale
+            file_etag = file_response.headers.get("ETag")
+            inputs_cache_key = ("workflow_inputs", owner, repo, workflow_path, file_etag)
+            cached_inputs = cache_get(inputs_cache_key) if file_etag else None
+            if cached_inputs is not None:
+                inputs, has_workflow_dispatch = cached_inputs
+            else:
+                content = file_response.text
+                logger.debug("Workflow file content length: %s chars", len(content))
                 
-                # Parse YAML
-                # GitHub API не предоставляет inputs напрямую, поэтому парсим YAML вручную
-                # Это стандартный подход, так как inputs определены только в YAML файле
-                try:
-                    workflow_yaml = yaml.safe_load(content)
-                    if not workflow_yaml:
-                        logger.warning("Workflow YAML is empty or None after parsing")
-                    else:
-                        logger.info(f"Parsed workflow YAML successfully, type: {type(workflow_yaml)}")
-                        if isinstance(workflow_yaml, dict):
-                            logger.info(f"Top-level keys: {list(workflow_yaml.keys())}")
-                            # Проверяем наличие 'on' ключа
-                            if 'on' in workflow_yaml:
-                                logger.info(f"'on' key found! Value type: {type(workflow_yaml['on'])}, Value: {workflow_yaml['on']}")
-                            else:
-                                logger.warning(f"'on' key NOT found in top-level keys. Available keys: {list(workflow_yaml.keys())}")
-                                # Проверяем, может быть 'on' это True (булево значение)?
-                                for key in workflow_yaml.keys():
-                                    if key is True or key == 'on':
-                                        logger.info(f"Found key that might be 'on': {key} (type: {type(key)})")
-                        else:
-                            logger.warning(f"Workflow YAML is not a dict, it's {type(workflow_yaml)}")
-                    
-                    # Extract inputs from workflow_dispatch
-                    # В YAML структура: on.workflow_dispatch.inputs
-                    # ВАЖНО: PyYAML парсит 'on' как булево True, поэтому проверяем оба варианта
-                    on_section = None
-                    if "on" in workflow_yaml:
-                        on_section = workflow_yaml["on"]
-                        logger.info("Found 'on' key as string")
-                    elif True in workflow_yaml:
-                        # PyYAML парсит 'on' как True (boolean)
-                        on_section = workflow_yaml[True]
-                        logger.info("Found 'on' key as boolean True (PyYAML quirk)")
-                    
-                    if on_section:
-                        logger.info(f"Workflow 'on' section type: {type(on_section)}, value: {on_section}")
-                        
-                        workflow_dispatch = None
-                        
-                        # Если on - это словарь (наиболее частый случай)
-                        if isinstance(on_section, dict):
-                            if "workflow_dispatch" in on_section:
-                                workflow_dispatch = on_section["workflow_dispatch"]
-                                has_workflow_dispatch = True
-                                logger.info("Found workflow_dispatch as dict key in 'on' section")
-                        
-                        # Если on - это список (редкий случай, но возможен)
-                        elif isinstance(on_section, list):
-                            for item in on_section:
-                                if isinstance(item, dict) and "workflow_dispatch" in item:
-                                    workflow_dispatch = item["workflow_dispatch"]
-                                    has_workflow_dispatch = True
-                                    logger.info("Found workflow_dispatch in list within 'on' section")
-                                    break
-                        
-                        if workflow_dispatch:
-                            if isinstance(workflow_dispatch, dict):
-                                logger.info(f"Workflow dispatch keys: {list(workflow_dispatch.keys())}")
-                                
-                                if "inputs" in workflow_dispatch:
-                                    raw_inputs = workflow_dispatch["inputs"]
-                                    if not isinstance(raw_inputs, dict):
-                                        logger.warning(f"Inputs is not a dict: {type(raw_inputs)}")
-                                    else:
-                                        logger.info(f"Found {len(raw_inputs)} inputs in workflow: {list(raw_inputs.keys())}")
-                                        
-                                        # Нормализуем inputs - сохраняем все поля из YAML
-                                        inputs = {}
-                                        for input_name, input_config in raw_inputs.items():
-                                            if not isinstance(input_config, dict):
-                                                logger.warning(f"Input '{input_name}' config is not a dict: {type(input_config)}, skipping")
-                                                continue
-                                            
-                                            input_type = input_config.get("type", "string")
-                                            logger.debug(f"Processing input '{input_name}': type={input_type}")
-                                            
-                                            inputs[input_name] = {
-                                                "type": input_type,
-                                                "description": input_config.get("description", ""),
-                                                "required": input_config.get("required", False),
-                                                "default": input_config.get("default")
-                                            }
-                                            
-                                            # Для choice типа - сохраняем options
-                                            if input_type == "choice":
-                                                options = input_config.get("options", [])
-                                                inputs[input_name]["options"] = options if isinstance(options, list) else []
-                                                logger.debug(f"Input '{input_name}' (choice) has {len(inputs[input_name]['options'])} options")
-                                            
-                                            # Для boolean - конвертируем default в bool
-                                            elif input_type == "boolean":
-                                                default_val = input_config.get("default", False)
-                                                if isinstance(default_val, str):
-                                                    inputs[input_name]["default"] = default_val.lower() in ("true", "1", "yes")
-                                                else:
-                                                    inputs[input_name]["default"] = bool(default_val)
-                                else:
-                                    logger.info("No 'inputs' key found in workflow_dispatch")
-                            else:
-                                logger.warning(f"Workflow dispatch is not a dict: {type(workflow_dispatch)}")
-                        else:
-                            logger.info("No 'workflow_dispatch' found in workflow 'on' section")
-                    else:
-                        logger.info("No 'on' section found in workflow YAML")
-                except yaml.YAMLError as e:
-                    logger.error(f"YAML parsing error: {str(e)}", exc_info=True)
-                except Exception as e:
-                    logger.error(f"Failed to parse workflow YAML: {str(e)}", exc_info=True)
-            
-            result = {
-                "found": True,
-                "name": workflow_data.get("name", workflow_id),
-                "path": workflow_data.get("path"),
-                "state": workflow_data.get("state"),
-                "inputs": inputs,
-                "has_workflow_dispatch": has_workflow_dispatch
-            }
-            logger.info(f"Returning workflow info: found={result['found']}, has_workflow_dispatch={result['has_workflow_dispatch']}, inputs_count={len(inputs)}")
-            return result
-            
+                # Parse in a worker thread so large files don't block the event loop
+                inputs, has_workflow_dispatch = await asyncio.to_thread(_parse_workflow_inputs, content)
+                if file_etag:
+                    cache_set(inputs_cache_key, (inputs, has_workflow_dispatch), INPUTS_CACHE_TTL)
+        
+        result = {
+            "found": True,
+            "name": workflow_data.get("name", workflow_id),
+            "path": workflow_data.get("path"),
+            "state": workflow_data.get("state"),
+            "inputs": inputs,
+            "has_workflow_dispatch": has_workflow_dispatch
+        }
+        logger.info("Returning workflow info: found=%s, has_workflow_dispatch=%s, inputs_count=%s", result['found'], result['has_workflow_dispatch'], len(inputs))
+        return result
+        
     except httpx.HTTPStatusError as e:
-        logger.error(f"Failed to get workflow info: {e.response.status_code} - {e.response.text}")
+        logger.error("Failed to get workflow info: %s - %s", e.response.status_code, e.response.text)
         if e.response.status_code == 404:
             return {
                 "found": False,
@@ -207,6 +357,38 @@ async def get_workflow_info(owner: str, repo: str, workflow_id: str) -> dict:
             }
         raise
     except Exception as e:
-        logger.error(f"Unexpected error getting workflow info: {str(e)}", exc_info=True)
+        logger.error("Unexpected error getting workflow info: %s", e, exc_info=True)
         raise
 
+
+async def get_workflows_info_bulk(owner: str, repo: str, workflow_ids: list) -> dict:
+    """
+    Get information for several workflows concurrently
+    
+    Lookups share the cached installation token and pooled connection,
+    so N workflows load in about the time of the slowest one.
+    
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        workflow_ids: Workflow file names or IDs
+        
+    Returns:
+        Dictionary {workflow_id: workflow info}; workflows that failed to load are reported as not found
+    """
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+    
+    async def get_one(workflow_id: str) -> dict:
+        async with semaphore:
+            return await get_workflow_info(owner, repo, workflow_id)
+    
+    # One failing workflow must not fail the whole list
+    results = await asyncio.gather(*[get_one(workflow_id) for workflow_id in workflow_ids], return_exceptions=True)
+    
+    infos = {}
+    for workflow_id, result in zip(workflow_ids, results):
+        if isinstance(result, Exception):
+            logger.warning("Failed to get workflow info for %s/%s/%s: %s", owner, repo, workflow_id, result)
+            result = {"found": False, "inputs": {}, "has_workflow_dispatch": False}
+        infos[workflow_id] = result
+    return infos
@@ -1,11 +1,16 @@
 """
 Service for getting repository workflows from GitHub API
 """
-import os
 import logging
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Mapping, Tuple
 import httpx
-from backend.services.github_app import get_installation_token, load_private_key
+import orjson
+from backend.services.github_app import get_app_installation_token
 from backend.services.cache import get as cache_get, set as cache_set
+from backend.services.http_client import conditional_get, GITHUB_JSON_HEADERS
+from backend.services.workflow_info import get_workflows_info_bulk
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +18,29 @@ logger = logging.getLogger(__name__)
 CACHE_TTL = 300
 
 
-async def get_workflows(owner: str, repo: str) -> list:
+def _workflow_entry(workflow: dict) -> dict:
+    """
+    Convert GitHub workflow object to workflow list entry
+    
+    Args:
+        workflow: Workflow object from GitHub API
+        
+    Returns:
+        Dictionary with id (workflow file name), name, path and state
+    """
+    # Extract workflow file name from path
+    path = workflow.get("path", "")
+    workflow_id = path.split("/")[-1] if "/" in path else path
+    
+    return {
+        "id": workflow_id,
+        "name": workflow.get("name", workflow_id),
+        "path": path,
+        "state": workflow.get("state", "active")
+    }
+
+
+async def get_workflows(owner: str, repo: str) -> Tuple[Mapping, ...]:
     """
     Get list of workflows from repository
     Uses caching for improved performance.
@@ -23,8 +50,8 @@ async def get_workflows(owner: str, repo: str) -> list:
         repo: Repository name
         
     Returns:
-        List of workflows with id and name
-        Format: [{"id": "workflow_id", "name": "Workflow Name", "path": ".github/workflows/ci.yml"}, ...]
+        Read-only sequence of workflows with id and name (shared with the cache - copy before modifying)
+        Format: ({"id": "workflow_id", "name": "Workflow Name", "path": ".github/workflows/ci.yml"}, ...)
     """
     # Cache key
     cache_key = f"workflows:{owner}:{repo}"
@@ -37,57 +64,39 @@ async def get_workflows(owner: str, repo: str) -> list:
         return workflows_list
     
     # Not in cache, fetch from API
-    # Get GitHub App credentials
-    app_id = os.getenv("GITHUB_APP_ID")
-    installation_id = os.getenv("GITHUB_APP_INSTALLATION_ID")
-    private_key_path = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH")
-    
-    if not all([app_id, installation_id]):
-        raise ValueError("GITHUB_APP_ID and GITHUB_APP_INSTALLATION_ID must be set")
-    
-    # Load private key and get installation token
-    private_key = load_private_key(private_key_path)
-    installation_token = await get_installation_token(app_id, installation_id, private_key)
+    # Installation token is cached until shortly before it expires
+    installation_token = await get_app_installation_token()
     
     headers = {
         "Authorization": f"token {installation_token}",
-        "Accept": "application/vnd.github.v3+json"
+        **GITHUB_JSON_HEADERS
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Get workflows
-            workflows_url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows"
-            response = await client.get(
-                workflows_url,
-                headers=headers,
-                params={"per_page": 100}  # GitHub default is 30, max is 100
-            )
-            response.raise_for_status()
-            
-            workflows_data = response.json()
-            workflows_list = []
-            
-            for workflow in workflows_data.get("workflows", []):
-                # Extract workflow file name from path
-                path = workflow.get("path", "")
-                workflow_id = path.split("/")[-1] if "/" in path else path
-                
-                workflows_list.append({
-                    "id": workflow_id,
-                    "name": workflow.get("name", workflow_id),
-                    "path": path,
-                    "state": workflow.get("state", "active")
-                })
-            
-            # Sort by name
-            workflows_list.sort(key=lambda x: x["name"].lower())
-            
-            # Cache the result
-            cache_set(cache_key, workflows_list, CACHE_TTL)
-            logger.info(f"Fetched {len(workflows_list)} workflows from API for {owner}/{repo}")
-            return workflows_list
-            
+        # Get workflows (revalidated with ETag: unchanged list comes back as 304)
+        workflows_url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows"
+        response = await conditional_get(
+            workflows_url,
+            headers,
+            {"per_page": 100}  # GitHub default is 30, max is 100
+        )
+        response.raise_for_status()
+        
+        workflows_data = orjson.loads(response.content)
+        workflows_list = [_workflow_entry(workflow) for workflow in workflows_data.get("workflows", [])]
+        
+        # Sort by name (case-insensitive), lowercasing each name once
+        sort_keys = [workflow["name"].lower() for workflow in workflows_list]
+        # Frozen so callers can't corrupt the cached entry: cache hits return the same object
+        workflows_list = tuple(
+            MappingProxyType(workflow) for _, workflow in sorted(zip(sort_keys, workflows_list), key=itemgetter(0))
+        )
+        
+        # Cache the result
+        cache_set(cache_key, workflows_list, CACHE_TTL)
+        logger.info(f"Fetched {len(workflows_list)} workflows from API for {owner}/{repo}")
+        return workflows_list
+        
     except httpx.HTTPStatusError as e:
         logger.error(f"Failed to get workflows: {e.response.status_code} - {e.response.text}")
         raise
@@ -95,3 +104,27 @@ async def get_workflows(owner: str, repo: str) -> list:
         logger.error(f"Unexpected error getting workflows: {str(e)}", exc_info=True)
         raise
 
+
+async def get_workflows_with_inputs(owner: str, repo: str) -> list:
+    """
+    Get list of workflows together with their workflow_dispatch inputs
+    Inputs of all workflows are fetched concurrently (bounded, see get_workflows_info_bulk).
+    
+    Args:
+        owner: Repository owner
+        repo: Repository name
+        
+    Returns:
+        List of workflows as returned by get_workflows, each with "inputs" and "has_workflow_dispatch"
+    """
+    workflows_list = await get_workflows(owner, repo)
+    infos = await get_workflows_info_bulk(owner, repo, [workflow["id"] for workflow in workflows_list])
+    
+    return [
+        {
+            **workflow,
+            "inputs": infos[workflow["id"]].get("inputs", {}),
+            "has_workflow_dispatch": infos[workflow["id"]].get("has_workflow_dispatch", False)
+        }
+        for workflow in workflows_list
+    ]
@@ -2,11 +2,18 @@
 Configuration file for GitHub Action Executor
 """
 import os
-from typing import List
+import re
+from typing import List, Mapping
+
+
+def _env_flag(env: Mapping[str, str], name: str, default: str = "true") -> bool:
+    """Read boolean setting from environment mapping ("true" in any case means True)"""
+    return env.get(name, default).lower() == "true"
+
 
 # Автоматическое открытие ссылки на запуск workflow
 # По умолчанию: True (включено)
-AUTO_OPEN_RUN = os.getenv("AUTO_OPEN_RUN", "true").lower() == "true"
+AUTO_OPEN_RUN = _env_flag(os.environ, "AUTO_OPEN_RUN")
 
 # Regex паттерны для фильтрации веток
 # Используются для автоматической фильтрации веток при загрузке
@@ -20,26 +27,50 @@ AUTO_OPEN_RUN = os.getenv("AUTO_OPEN_RUN", "true").lower() == "true"
 #   [".*-prod$"] - ветки заканчивающиеся на "-prod"
 #
 # Текущая настройка: main, stable-*, stream-*
-BRANCH_FILTER_PATTERNS: List[str] = [
+DEFAULT_BRANCH_FILTER_PATTERNS: List[str] = [
     "^main$",      # Точное совпадение с main
     "^stable-.*",  # Все ветки начинающиеся с stable-
     "^stream-.*"   # Все ветки начинающиеся с stream-
 ]
 
-# Можно переопределить через переменную окружения (через запятую)
-# Пример: BRANCH_FILTER_PATTERNS=^main$,^stable-.*,^stream-.*
-env_patterns = os.getenv("BRANCH_FILTER_PATTERNS", "")
-if env_patterns:
-    BRANCH_FILTER_PATTERNS = [p.strip() for p in env_patterns.split(",") if p.strip()]
+
+def _branch_filter_patterns(env: Mapping[str, str]) -> List[str]:
+    """
+    Branch filter patterns from environment mapping
+    
+    Можно переопределить через переменную окружения (через запятую)
+    Пример: BRANCH_FILTER_PATTERNS=^main$,^stable-.*,^stream-.*
+    """
+    env_patterns = env.get("BRANCH_FILTER_PATTERNS", "")
+    if env_patterns:
+        return [p.strip() for p in env_patterns.split(",") if p.strip()]
+    return list(DEFAULT_BRANCH_FILTER_PATTERNS)
+
+
+BRANCH_FILTER_PATTERNS: List[str] = _branch_filter_patterns(os.environ)
+
+
+def _compile_branch_pattern(pattern: str) -> re.Pattern:
+    """Compile branch filter pattern (case-insensitive); invalid regex is matched as a case-sensitive literal substring"""
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(pattern))
+
+
+# Паттерны компилируются один раз при загрузке конфига
+# Каждый паттерн отдельно: объединение через "|" ломает inline-флаги и нумерацию групп
+# Пустой список - фильтрация отключена (показываются все ветки)
+BRANCH_FILTER_REGEXES: List[re.Pattern] = [_compile_branch_pattern(p) for p in BRANCH_FILTER_PATTERNS]
 
 # Проверка прав пользователя перед запуском workflow
 # Если True, проверяется является ли пользователь коллаборатором (имеет доступ к репозиторию)
 # Если False, любой авторизованный пользователь может запускать workflows
 # По умолчанию: True (проверка включена)
-CHECK_PERMISSIONS = os.getenv("CHECK_PERMISSIONS", "true").lower() == "true"
+CHECK_PERMISSIONS = _env_flag(os.environ, "CHECK_PERMISSIONS")
 
 # Выполнение workflow от имени авторизованного пользователя
 # По умолчанию: True (workflow выполняются от имени пользователя)
 # Если False, workflow выполняются от имени GitHub App
-USE_USER_TOKEN_FOR_WORKFLOWS = os.getenv("USE_USER_TOKEN_FOR_WORKFLOWS", "true").lower() == "true"
+USE_USER_TOKEN_FOR_WORKFLOWS = _env_flag(os.environ, "USE_USER_TOKEN_FOR_WORKFLOWS")
 
@@ -2,49 +2,176 @@
 Pytest configuration and fixtures
 """
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import patch
+import json
 import os
+import base64
+import httpx
+from types import MappingProxyType
 
-# Set test environment variables before importing app
-os.environ["SECRET_KEY"] = "test-secret-key-for-testing-only"
-os.environ["GITHUB_CLIENT_ID"] = "test_client_id"
-os.environ["GITHUB_CLIENT_SECRET"] = "test_client_secret"
-os.environ["GITHUB_APP_ID"] = "123456"
-os.environ["GITHUB_APP_INSTALLATION_ID"] = "12345678"
-os.environ["CHECK_PERMISSIONS"] = "false"  # Disable permission checks in tests
-os.environ["USE_USER_TOKEN_FOR_WORKFLOWS"] = "false"
 
-from app import app
+def pytest_configure(config):
+    """Set test environment variables once, before any test module imports app"""
+    os.environ["SECRET_KEY"] = "test-secret-key-for-testing-only"
+    os.environ["GITHUB_CLIENT_ID"] = "test_client_id"
+    os.environ["GITHUB_CLIENT_SECRET"] = "test_client_secret"
+    os.environ["GITHUB_APP_ID"] = "123456"
+    os.environ["GITHUB_APP_INSTALLATION_ID"] = "12345678"
+    os.environ["CHECK_PERMISSIONS"] = "false"  # Disable permission checks in tests
+    os.environ["USE_USER_TOKEN_FOR_WORKFLOWS"] = "false"
+
+
+@pytest.fixture(scope="session")
+def app_instance():
+    """FastAPI app (imported lazily, after environment is configured)"""
+    from app import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def _session_client(app_instance):
+    """Test client shared by the whole session (app startup/shutdown run once)"""
+    # Inside the with-block TestClient keeps one blocking portal (event loop thread) for all requests
+    with TestClient(app_instance, backend="asyncio") as test_client:
+        yield test_client
 
 
 @pytest.fixture
-def client():
+def client(_session_client, app_instance):
     """Create a test client for the FastAPI app"""
-    return TestClient(app)
+    yield _session_client
+    # Keep tests isolated: drop session cookies and dependency overrides set by the test
+    _session_client.cookies.clear()
+    app_instance.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="session")
+def rsa_private_key_pem():
+    """RSA private key in PEM format for GitHub App JWT tests (generated once per session)"""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import serialization
+    
+    # 1024 bits is enough here: tests check JWT structure, not signature strength
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode("utf-8")
+
+
+@pytest_asyncio.fixture
+async def aclient(app_instance):
+    """Async client calling the ASGI app in-process (no TestClient thread/portal, cookies kept per test)"""
+    transport = httpx.ASGITransport(app=app_instance)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        yield async_client
+
+
+async def asgi_get(app, path: str):
+    """
+    Send GET request to the ASGI app in-process (no TestClient thread/portal)
+    
+    Returns:
+        Tuple (status code, response body)
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as asgi_client:
+        response = await asgi_client.get(path)
+    return response.status_code, response.content
+
+
+def async_return(value):
+    """Coroutine function returning value - lighter than AsyncMock when calls aren't asserted"""
+    async def _stub(*args, **kwargs):
+        return value
+    return _stub
 
 
 @pytest.fixture
+def mock_app_token():
+    """Mock GitHub App installation token in every service that requests one"""
+    token_stub = async_return("mock_installation_token")
+    with patch("backend.services.workflow.get_app_installation_token", token_stub), \
+         patch("backend.services.workflows.get_app_installation_token", token_stub), \
+         patch("backend.services.workflow_info.get_app_installation_token", token_stub), \
+         patch("backend.services.branches.get_app_installation_token", token_stub):
+        yield token_stub
+
+
+# Read-only session data shared by all tests (no per-test allocation, no accidental writes)
+_MOCK_SESSION = MappingProxyType({
+    "user": MappingProxyType({
+        "login": "testuser",
+        "name": "Test User",
+        "avatar_url": "https://github.com/testuser.png"
+    }),
+    "access_token": "test_access_token_12345"
+})
+
+
+@pytest.fixture(scope="session")
 def mock_session():
-    """Mock session with authenticated user"""
-    return {
-        "user": {
-            "login": "testuser",
-            "name": "Test User",
-            "avatar_url": "https://github.com/testuser.png"
-        },
-        "access_token": "test_access_token_12345"
-    }
+    """Mock session with authenticated user (read-only)"""
+    return _MOCK_SESSION
+
+
+@pytest.fixture(scope="session")
+def session_cookie(mock_session):
+    """Signed session cookie with mock_session data (signed once per test session)"""
+    from itsdangerous import TimestampSigner
+    # Same encoding as starlette SessionMiddleware: signed base64 of JSON
+    session_data = {**mock_session, "user": dict(mock_session["user"])}
+    payload = base64.b64encode(json.dumps(session_data).encode("utf-8"))
+    return TimestampSigner(os.environ["SECRET_KEY"]).sign(payload).decode("utf-8")
 
 
 @pytest.fixture
-def mock_github_response():
-    """Mock GitHub API response"""
-    def _create_response(data, status_code=200):
-        response = Mock()
-        response.status_code = status_code
-        response.json.return_value = data
-        response.raise_for_status = Mock()
-        return response
-    return _create_response
+def authed_client(client, session_cookie):
+    """Test client logged in as mock_session user via the session cookie"""
+    client.cookies.set("session", session_cookie)
+    return client
+
+
+@pytest.fixture
+def authenticated(app_instance, mock_session):
+    """Authenticate API requests as mock_session user (overrides get_user_from_session)"""
+    from backend.routes.api import get_user_from_session
+    user_data = (mock_session["user"], mock_session["access_token"])
+    app_instance.dependency_overrides[get_user_from_session] = lambda: user_data
+    yield mock_session
+    app_instance.dependency_overrides.pop(get_user_from_session, None)
+
+
+class _Resp:
+    """Minimal stand-in for httpx.Response (much cheaper to build than Mock)"""
+    __slots__ = ("status_code", "content", "headers", "_data")
+    
+    def __init__(self, data=None, status_code=200, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(data).encode() if data is not None else b""
+        self.headers = headers or {}
+        self._data = data
+    
+    @property
+    def text(self):
+        return self.content.decode()
+    
+    def json(self):
+        return self._data
+    
+    def raise_for_status(self):
+        pass
+
+
+# Shared responses: tests only read them
+_EMPTY_204 = _Resp(None, 204)
+
 
+def make_github_response(data=None, status_code=200):
+    """Mock GitHub API response (plain function - no per-test state, so not a fixture)"""
+    if data is None and status_code == 204:
+        return _EMPTY_204
+    return _Resp(data, status_code)
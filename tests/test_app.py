@@ -1,118 +1,121 @@
 """
 Tests for main application
 """
+import re
 import pytest
-from fastapi.testclient import TestClient
+from urllib.parse import quote
+from unittest.mock import patch, AsyncMock
 
-
-def test_root_endpoint(client):
-    """Test root endpoint returns HTML"""
-    response = client.get("/")
-    assert response.status_code == 200
-    assert "text/html" in response.headers["content-type"]
+from backend.routes.workflow import templates
+from tests.conftest import asgi_get
 
 
-def test_root_endpoint_with_query_params(client):
-    """Test root endpoint with query parameters - verifies form pre-filling"""
-    response = client.get("/?owner=testowner&repo=testrepo&workflow_id=test.yml")
+@pytest.mark.parametrize("url", [
+    "/",
+    # Query parameters pre-fill the form
+    "/?owner=testowner&repo=testrepo&workflow_id=test.yml",
+], ids=["plain", "query_params"])
+def test_root_endpoint(client, url):
+    """Test root endpoint returns HTML (template compiled on first render is reused)"""
+    response = client.get(url)
     assert response.status_code == 200
-    # Should render the form with pre-filled values
     assert "text/html" in response.headers["content-type"]
-    # Query params should be preserved in the response (form should have these values)
-    # This tests that the UI can be pre-filled from URL params
 
 
-def test_static_files_route_exists(client):
+@pytest.mark.asyncio
+async def test_static_files_route_exists(app_instance):
     """Test that static files route is configured (doesn't return 500)"""
     # This tests that static file serving is configured
     # Even if file doesn't exist, route should be handled (404), not crash (500)
-    response = client.get("/static/nonexistent.css")
-    assert response.status_code in [200, 404], "Static route should return 200 or 404, not 500"
+    status, _ = await asgi_get(app_instance, "/static/nonexistent.css")
+    assert status in [200, 404], "Static route should return 200 or 404, not 500"
 
 
-def test_health_endpoint(client):
+@pytest.mark.asyncio
+async def test_health_endpoint(app_instance):
     """Test health endpoint"""
-    response = client.get("/health")
-    assert response.status_code == 200
-    data = response.json()
-    assert data == {"status": "ok"}
-
-
-def test_auth_routes_exist(client):
-    """Test auth routes are registered"""
-    # These should return redirects or errors, not 404
+    status, body = await asgi_get(app_instance, "/health")
+    assert status == 200
+    assert body == b'{"status":"ok"}'
+
+
+@pytest.mark.parametrize("url", [
+    # Auth: redirect to GitHub (or some response)
+    "/auth/github",
+    # Workflow without auth: redirect to OAuth or the trigger page
+    "/workflow/trigger",
+    # API without auth: any response
+    "/api/branches?owner=test&repo=test",
+], ids=["auth", "workflow", "api"])
+def test_routes_registered(client, url):
+    """Test auth, workflow and API routes are registered (respond with anything but 404)"""
     # follow_redirects=False to prevent TestClient from following redirect to GitHub
-    response = client.get("/auth/github", follow_redirects=False)
-    # Should redirect (307) or return some response (not 404)
-    assert response.status_code in [307, 302, 200]  # Redirect status codes
-
+    response = client.get(url, follow_redirects=False)
+    assert response.status_code != 404
 
-def test_workflow_routes_exist(client):
-    """Test workflow routes are registered"""
-    # Without auth, should redirect to OAuth (307) but not 404
-    # follow_redirects=False to prevent following redirect to GitHub
-    response = client.get("/workflow/trigger", follow_redirects=False)
-    # Should redirect (307) to OAuth, not 404
-    assert response.status_code in [307, 302], f"Expected redirect, got {response.status_code}"
 
+# Trigger form with a non-default ref and extra workflow inputs
+_TRIGGER_FORM = {
+    "owner": "testowner",
+    "repo": "testrepo",
+    "workflow_id": "test.yml",
+    "ref": "develop",
+    "test_type": "unit",
+    "from_pr": "123"
+}
 
-def test_api_routes_exist(client):
-    """Test API routes are registered"""
-    # Without auth, should get 401 but not 404
-    response = client.get("/api/branches?owner=test&repo=test")
-    assert response.status_code != 404
+# ref in result page links, raw or URL-encoded (one scan of the page)
+_REF_LINK_RE = re.compile(r"ref(=|%3D)develop")
 
 
-def test_result_page_preserves_ref_and_inputs(client, mock_session):
+def test_result_page_preserves_ref_and_inputs(authed_client):
     """Test that result page preserves ref and inputs in 'Try again' links"""
-    from unittest.mock import patch, Mock, AsyncMock
-    
-    # Mock permission check
-    with patch("backend.services.permissions.check_repository_access", new_callable=AsyncMock) as mock_perms:
-        mock_perms.return_value = True
+    # Mock workflow trigger to return error (to test error page)
+    with patch("backend.routes.workflow.trigger_workflow", new_callable=AsyncMock) as mock_trigger:
+        mock_trigger.side_effect = Exception("Test error")
         
-        # Mock workflow trigger to return error (to test error page)
-        with patch("backend.services.workflow.trigger_workflow", new_callable=AsyncMock) as mock_trigger:
-            mock_trigger.side_effect = Exception("Test error")
-            
-            # FastAPI TestClient doesn't have session_transaction like Flask
-            # Instead, we'll mock the session at the route level
-            # Create a custom request that has session data
-            from fastapi import Request
-            from unittest.mock import MagicMock
-            
-            # Mock request.session to return our mock_session
-            def mock_request_with_session(*args, **kwargs):
-                request = MagicMock(spec=Request)
-                request.session = mock_session.copy()
-                return request
-            
-            # For now, skip this test as it requires complex session mocking
-            # The functionality is tested in integration tests
-            pytest.skip("Requires complex session mocking in FastAPI TestClient")
-
-
-def test_result_page_success_preserves_ref_and_inputs(client, mock_session):
+        response = authed_client.post("/workflow/trigger", data=_TRIGGER_FORM)
+    
+    assert response.status_code == 200
+    content = response.text
+    assert "Try again" in content
+    assert _REF_LINK_RE.search(content)
+    assert "test_type" in content and "from_pr" in content
+
+
+def test_result_page_success_preserves_ref_and_inputs(authed_client):
     """Test that successful result page preserves ref and inputs in 'Run again' links"""
-    # FastAPI TestClient doesn't have session_transaction like Flask
-    # This test requires complex session mocking
-    # The functionality is tested in integration tests
-    pytest.skip("Requires complex session mocking in FastAPI TestClient")
+    result = {
+        "success": True,
+        "message": "Workflow triggered successfully",
+        "workflow_url": "https://github.com/testowner/testrepo/actions/workflows/test.yml",
+        "trigger_time": "2024-01-01T00:00:00Z"
+    }
+    with patch("backend.routes.workflow.trigger_workflow", new_callable=AsyncMock) as mock_trigger:
+        mock_trigger.return_value = result
+        
+        response = authed_client.post("/workflow/trigger", data=_TRIGGER_FORM)
+    
+    assert response.status_code == 200
+    content = response.text
+    assert "Run again" in content
+    assert _REF_LINK_RE.search(content)
+    assert "test_type" in content and "from_pr" in content
+    assert mock_trigger.call_args.kwargs["inputs"] == {"test_type": "unit", "from_pr": "123"}
 
 
-def test_urlencode_filter():
+_URLENCODE_CASES = [
+    ("test value", quote("test value", safe="")),
+    (123, "123"),
+    ("test&value=123", quote("test&value=123", safe="")),
+    (None, ""),
+    ("", ""),
+]
+
+
+@pytest.mark.parametrize("value, expected", _URLENCODE_CASES)
+def test_urlencode_filter(value, expected):
     """Test that urlencode filter works correctly in Jinja2 templates"""
-    from backend.routes.workflow import templates
-    from urllib.parse import quote
-    
-    # Test the filter directly
     filter_func = templates.env.filters.get("urlencode")
     assert filter_func is not None, "urlencode filter should be registered"
-    
-    # Test various inputs
-    assert filter_func("test value") == quote("test value", safe="")
-    assert filter_func(123) == "123"
-    assert filter_func("test&value=123") == quote("test&value=123", safe="")
-    assert filter_func(None) == ""
-    assert filter_func("") == ""
-
+    assert filter_func(value) == expected
@@ -2,126 +2,84 @@
 Tests for OAuth redirect URL validation and parameter preservation
 """
 import pytest
-from fastapi.testclient import TestClient
-from unittest.mock import patch, Mock, AsyncMock
-from urllib.parse import urlparse, parse_qs
-
-
-def test_oauth_login_accepts_internal_paths(client):
+from types import SimpleNamespace
+from unittest.mock import patch, Mock
+from fastapi import Request
+
+from backend.routes.auth import validate_redirect_url
+from backend.services.http_client import get_client
+from tests.conftest import async_return, make_github_response
+
+# GitHub OAuth responses (shared prototypes, tests only read them)
+_TOKEN_RESPONSE = make_github_response({"access_token": "test_access_token"})
+_USER_RESPONSE = make_github_response({
+    "login": "testuser",
+    "name": "Test User",
+    "avatar_url": "https://github.com/testuser.png"
+})
+
+
+@pytest.fixture
+def github_oauth_mocks():
+    """Mock GitHub OAuth token exchange (POST) and user info (GET) for the callback"""
+    # Only the app's shared GitHub client is patched; the test client keeps calling the app
+    # (patch.object removes the instance attributes on exit, so class-level patches in other tests still apply)
+    github_client = get_client()
+    with patch.object(github_client, "post", async_return(_TOKEN_RESPONSE)), \
+         patch.object(github_client, "get", async_return(_USER_RESPONSE)):
+        yield SimpleNamespace(token=_TOKEN_RESPONSE, user=_USER_RESPONSE)
+
+
+@pytest.mark.asyncio
+async def test_oauth_login_accepts_internal_paths(aclient, github_oauth_mocks):
     """Test that OAuth login accepts and saves internal paths via real HTTP request"""
-    from unittest.mock import patch
-    
     # Test with relative path - should work
-    response = client.get("/auth/github?redirect_after=/?owner=test&repo=test", follow_redirects=False)
+    response = await aclient.get("/auth/github?redirect_after=/?owner=test&repo=test", follow_redirects=False)
     assert response.status_code in [307, 302]  # Should redirect to GitHub OAuth
     
     # Test with path without leading slash - should be normalized to /?owner=test
-    response = client.get("/auth/github?redirect_after=?owner=test", follow_redirects=False)
+    response = await aclient.get("/auth/github?redirect_after=?owner=test", follow_redirects=False)
     assert response.status_code in [307, 302]
     
     # Verify normalization by checking callback redirects to normalized path
-    cookies = response.cookies
-    with patch("httpx.AsyncClient.post") as mock_post:
-        mock_token_response = Mock()
-        mock_token_response.status_code = 200
-        mock_token_response.json.return_value = {"access_token": "test_token"}
-        mock_token_response.raise_for_status = Mock()
-        mock_post.return_value = mock_token_response
-        
-        with patch("httpx.AsyncClient.get") as mock_get:
-            mock_user_response = Mock()
-            mock_user_response.status_code = 200
-            mock_user_response.json.return_value = {"login": "testuser", "name": "Test", "avatar_url": ""}
-            mock_user_response.raise_for_status = Mock()
-            mock_get.return_value = mock_user_response
-            
-            callback_response = client.get("/auth/github/callback?code=test", follow_redirects=False)
-            assert callback_response.status_code in [303, 307, 302]
-            # The redirect should be to normalized path /?owner=test (not ?owner=test)
-            # We verify this by checking the redirect location contains leading slash
-            if callback_response.headers.get("location"):
-                assert callback_response.headers["location"].startswith("/")
+    callback_response = await aclient.get("/auth/github/callback?code=test", follow_redirects=False)
+    assert callback_response.status_code in [303, 307, 302]
+    # The redirect should be to normalized path /?owner=test (not ?owner=test)
+    # We verify this by checking the redirect location contains leading slash
+    if callback_response.headers.get("location"):
+        assert callback_response.headers["location"].startswith("/")
     
     # Test with workflow path
-    response = client.get("/auth/github?redirect_after=/workflow/trigger?owner=test&repo=test", follow_redirects=False)
+    response = await aclient.get("/auth/github?redirect_after=/workflow/trigger?owner=test&repo=test", follow_redirects=False)
     assert response.status_code in [307, 302]
 
 
-def test_oauth_login_blocks_external_urls(client):
-    """Test that OAuth login blocks external URLs via real HTTP request"""
-    # Test with external URL - should be blocked (normalized to /)
-    response = client.get("/auth/github?redirect_after=https://evil.com/phishing", follow_redirects=False)
-    assert response.status_code in [307, 302]  # Still redirects to OAuth, but URL is normalized
-    
-    # Verify by checking callback redirects to /, not evil.com
-    from unittest.mock import patch
-    
-    # First, get session from login
-    response = client.get("/auth/github?redirect_after=https://evil.com/phishing", follow_redirects=False)
-    cookies = response.cookies
-    
-    # Mock GitHub OAuth
-    with patch("httpx.AsyncClient.post") as mock_post:
-        mock_token_response = Mock()
-        mock_token_response.status_code = 200
-        mock_token_response.json.return_value = {"access_token": "test_token"}
-        mock_token_response.raise_for_status = Mock()
-        mock_post.return_value = mock_token_response
-        
-        with patch("httpx.AsyncClient.get") as mock_get:
-            mock_user_response = Mock()
-            mock_user_response.status_code = 200
-            mock_user_response.json.return_value = {"login": "testuser", "name": "Test", "avatar_url": ""}
-            mock_user_response.raise_for_status = Mock()
-            mock_get.return_value = mock_user_response
-            
-            # Call callback - should redirect to /, not evil.com
-            response = client.get("/auth/github/callback?code=test", follow_redirects=False)
-            assert response.status_code in [303, 307, 302]
-            # The redirect should be to /, not evil.com (validated by validate_redirect_url)
-
-
-def test_oauth_login_handles_empty_redirect(client):
+@pytest.mark.asyncio
+async def test_oauth_login_handles_empty_redirect(aclient, github_oauth_mocks):
     """Test that OAuth login handles empty/missing redirect_after via real HTTP request"""
-    from unittest.mock import patch
-    
     # Test without redirect_after - should still work
-    response = client.get("/auth/github", follow_redirects=False)
+    response = await aclient.get("/auth/github", follow_redirects=False)
     assert response.status_code in [307, 302]
     
     # Test with empty string redirect_after - should normalize to /
-    response = client.get("/auth/github?redirect_after=", follow_redirects=False)
+    response = await aclient.get("/auth/github?redirect_after=", follow_redirects=False)
     assert response.status_code in [307, 302]
     
     # After callback, should redirect to / (default)
-    response = client.get("/auth/github", follow_redirects=False)
-    cookies = response.cookies
+    response = await aclient.get("/auth/github", follow_redirects=False)
     
-    with patch("httpx.AsyncClient.post") as mock_post:
-        mock_token_response = Mock()
-        mock_token_response.status_code = 200
-        mock_token_response.json.return_value = {"access_token": "test_token"}
-        mock_token_response.raise_for_status = Mock()
-        mock_post.return_value = mock_token_response
-        
-        with patch("httpx.AsyncClient.get") as mock_get:
-            mock_user_response = Mock()
-            mock_user_response.status_code = 200
-            mock_user_response.json.return_value = {"login": "testuser", "name": "Test", "avatar_url": ""}
-            mock_user_response.raise_for_status = Mock()
-            mock_get.return_value = mock_user_response
-            
-            response = client.get("/auth/github/callback?code=test", follow_redirects=False)
-            assert response.status_code in [303, 307, 302]  # Should redirect to / (default)
-            # Verify redirect is to / (root)
-            if response.headers.get("location"):
-                assert response.headers["location"] == "/" or response.headers["location"].startswith("/")
+    response = await aclient.get("/auth/github/callback?code=test", follow_redirects=False)
+    assert response.status_code in [303, 307, 302]  # Should redirect to / (default)
+    # Verify redirect is to / (root)
+    if response.headers.get("location"):
+        assert response.headers["location"] == "/" or response.headers["location"].startswith("/")
 
 
-def test_oauth_login_saves_redirect_url(client):
+@pytest.mark.asyncio
+async def test_oauth_login_saves_redirect_url(aclient):
     """Test that OAuth login saves redirect URL from query parameter"""
     # Test with redirect_after parameter
-    response = client.get("/auth/github?redirect_after=/?owner=test&repo=test", follow_redirects=False)
+    response = await aclient.get("/auth/github?redirect_after=/?owner=test&repo=test", follow_redirects=False)
     
     # Should redirect to GitHub OAuth
     assert response.status_code in [307, 302]
@@ -131,10 +89,11 @@ def test_oauth_login_saves_redirect_url(client):
     # For now, just verify the endpoint doesn't crash
 
 
-def test_oauth_login_validates_redirect_url(client):
+@pytest.mark.asyncio
+async def test_oauth_login_validates_redirect_url(aclient):
     """Test that OAuth login validates redirect URL"""
     # Test with external URL - should be blocked
-    response = client.get("/auth/github?redirect_after=https://evil.com", follow_redirects=False)
+    response = await aclient.get("/auth/github?redirect_after=https://evil.com", follow_redirects=False)
     
     # Should still redirect to GitHub OAuth (validation happens, but doesn't block login)
     assert response.status_code in [307, 302]
@@ -142,90 +101,11 @@ def test_oauth_login_validates_redirect_url(client):
     # The external URL should be normalized to "/" in session
 
 
-def test_oauth_callback_redirects_to_saved_url(client):
-    """Test that OAuth callback redirects to saved URL"""
-    from unittest.mock import patch
-    
-    # FastAPI TestClient doesn't support session_transaction
-    # Instead, we'll test by first calling github_login to set session,
-    # then mocking the callback
-    # First, call github_login to set up session
-    response = client.get("/auth/github?redirect_after=/?owner=test&repo=test", follow_redirects=False)
-    assert response.status_code in [307, 302]
-    
-    # Get session cookie from response
-    cookies = response.cookies
-    
-    # Mock GitHub OAuth token exchange - need to mock httpx calls
-    with patch("httpx.AsyncClient.post") as mock_post:
-        # Mock token response
-        mock_token_response = Mock()
-        mock_token_response.status_code = 200
-        mock_token_response.json.return_value = {"access_token": "test_access_token"}
-        mock_token_response.raise_for_status = Mock()
-        mock_post.return_value = mock_token_response
-        
-        with patch("httpx.AsyncClient.get") as mock_get:
-            # Mock user info response
-            mock_user_response = Mock()
-            mock_user_response.status_code = 200
-            mock_user_response.json.return_value = {
-                "login": "testuser",
-                "name": "Test User",
-                "avatar_url": "https://github.com/testuser.png"
-            }
-            mock_user_response.raise_for_status = Mock()
-            mock_get.return_value = mock_user_response
-            
-            # Call callback - TestClient preserves cookies automatically
-            response = client.get("/auth/github/callback?code=test_code", follow_redirects=False)
-            
-            # Should redirect to saved URL
-            assert response.status_code in [303, 307, 302]
-            # Note: Can't easily check redirect location in TestClient without following redirects
-
-
-def test_oauth_callback_validates_redirect_url(client):
-    """Test that OAuth callback validates redirect URL before redirecting"""
-    from unittest.mock import patch
-    
-    # Test validation by calling github_login with external URL
-    # The external URL should be normalized to "/" during login
-    response = client.get("/auth/github?redirect_after=https://evil.com/phishing", follow_redirects=False)
-    assert response.status_code in [307, 302]
-    
-    # Get cookies
-    cookies = response.cookies
-    
-    # Mock GitHub OAuth token exchange
-    with patch("httpx.AsyncClient.post") as mock_post:
-        mock_token_response = Mock()
-        mock_token_response.status_code = 200
-        mock_token_response.json.return_value = {"access_token": "test_access_token"}
-        mock_token_response.raise_for_status = Mock()
-        mock_post.return_value = mock_token_response
-        
-        with patch("httpx.AsyncClient.get") as mock_get:
-            mock_user_response = Mock()
-            mock_user_response.status_code = 200
-            mock_user_response.json.return_value = {
-                "login": "testuser",
-                "name": "Test User",
-                "avatar_url": "https://github.com/testuser.png"
-            }
-            mock_user_response.raise_for_status = Mock()
-            mock_get.return_value = mock_user_response
-            
-            response = client.get("/auth/github/callback?code=test_code", follow_redirects=False)
-            
-            # Should redirect, but to "/" (safe fallback), not to evil.com
-            assert response.status_code in [303, 307, 302]
-
-
-def test_workflow_saves_relative_path_on_auth_required(client):
+@pytest.mark.asyncio
+async def test_workflow_saves_relative_path_on_auth_required(aclient):
     """Test that workflow endpoint saves relative path (not full URL) when auth required"""
     # Make request to workflow trigger without auth
-    response = client.get("/workflow/trigger?owner=test&repo=test&workflow_id=ci.yml", follow_redirects=False)
+    response = await aclient.get("/workflow/trigger?owner=test&repo=test&workflow_id=ci.yml", follow_redirects=False)
     
     # Should redirect to OAuth
     assert response.status_code in [307, 302]
@@ -235,10 +115,11 @@ def test_workflow_saves_relative_path_on_auth_required(client):
     # and that it uses relative path (tested in integration)
 
 
-def test_main_page_does_not_save_redirect_on_open(client):
+@pytest.mark.asyncio
+async def test_main_page_does_not_save_redirect_on_open(aclient):
     """Test that main page does NOT save redirect URL on open (optimization)"""
     # Open main page with parameters
-    response = client.get("/?owner=test&repo=test&workflow_id=ci.yml")
+    response = await aclient.get("/?owner=test&repo=test&workflow_id=ci.yml")
     
     assert response.status_code == 200
     
@@ -248,75 +129,93 @@ def test_main_page_does_not_save_redirect_on_open(client):
     # If we go to auth without redirect_after, it should not use a saved value from main page
 
 
-def test_validate_redirect_url_empty_string_explicit(client):
-    """Test that validate_redirect_url explicitly handles empty string input"""
-    from backend.routes.auth import validate_redirect_url
-    from fastapi import Request
-    from unittest.mock import Mock
-    
-    request = Mock(spec=Request)
-    request.base_url = "http://testserver"
-    request.url.hostname = "testserver"
-    
-    # Test empty string - should return "/"
-    result = validate_redirect_url("", request)
-    assert result == "/", "Empty string should normalize to /"
-    
-    # Test None - should return "/"
-    result = validate_redirect_url(None, request)
-    assert result == "/", "None should normalize to /"
-
-
-def test_validate_redirect_url_path_normalization_explicit(client):
-    """Test that validate_redirect_url explicitly normalizes paths without leading slash"""
-    from backend.routes.auth import validate_redirect_url
-    from fastapi import Request
-    from unittest.mock import Mock
-    
-    request = Mock(spec=Request)
-    request.base_url = "http://testserver"
-    request.url.hostname = "testserver"
-    
-    # Test path without leading slash - should be normalized
-    result = validate_redirect_url("?owner=test", request)
-    assert result.startswith("/"), "Path without leading slash should be normalized to start with /"
-    assert result == "/?owner=test", "Normalized path should be /?owner=test"
-    
-    # Test path without leading slash and query
-    result = validate_redirect_url("workflow/trigger", request)
-    assert result == "/workflow/trigger", "Path should be normalized to /workflow/trigger"
-    
-    # Test path with leading slash - should remain unchanged
-    result = validate_redirect_url("/?owner=test", request)
-    assert result == "/?owner=test", "Path with leading slash should remain unchanged"
-
-
-def test_redirect_url_preserves_query_params_via_real_request(client):
-    """Test that redirect URL preserves query parameters via real HTTP request"""
-    from unittest.mock import patch
-    
-    # Test with multiple query parameters - save via login
-    redirect_url = "/?owner=testowner&repo=testrepo&workflow_id=ci.yml&ref=main&param1=value1&param2=value2"
-    response = client.get(f"/auth/github?redirect_after={redirect_url}", follow_redirects=False)
-    assert response.status_code in [307, 302]
-    cookies = response.cookies
-    
-    # Verify it's preserved through callback
-    with patch("httpx.AsyncClient.post") as mock_post:
-        mock_token_response = Mock()
-        mock_token_response.status_code = 200
-        mock_token_response.json.return_value = {"access_token": "test_token"}
-        mock_token_response.raise_for_status = Mock()
-        mock_post.return_value = mock_token_response
+# Request stub for validate_redirect_url (built once, tests only read it)
+_REQUEST = Mock(spec=Request)
+_REQUEST.base_url = "http://testserver"
+_REQUEST.url.hostname = "testserver"
+
+
+@pytest.mark.parametrize("redirect_url, expected", [
+    # Empty values normalize to /
+    ("", "/"),
+    (None, "/"),
+    # Paths without leading slash are normalized
+    ("?owner=test", "/?owner=test"),
+    ("workflow/trigger", "/workflow/trigger"),
+    # Path with leading slash remains unchanged
+    ("/?owner=test", "/?owner=test"),
+    # Absolute URLs: same host is reduced to its path, external host is blocked
+    ("http://testserver/workflow/trigger?owner=test", "/workflow/trigger?owner=test"),
+    ("https://evil.com/phishing", "/"),
+], ids=["empty", "none", "query_without_slash", "path_without_slash", "path_with_slash", "same_host", "external"])
+def test_validate_redirect_url_normalization(redirect_url, expected):
+    """Test that validate_redirect_url normalizes paths and blocks external URLs"""
+    assert validate_redirect_url(redirect_url, _REQUEST) == expected
+
+
+class TestOAuthCallback:
+    """Login then callback flow: each test saves redirect_after on login and checks the callback redirect"""
+    
+    @pytest.fixture(autouse=True)
+    def _github_oauth(self, github_oauth_mocks):
+        """GitHub OAuth responses are mocked for every test in the class"""
+        self.github = github_oauth_mocks
+    
+    @pytest.mark.asyncio
+    async def test_oauth_login_blocks_external_urls(self, aclient):
+        """Test that OAuth login blocks external URLs via real HTTP request"""
+        # Test with external URL - should be blocked (normalized to /)
+        response = await aclient.get("/auth/github?redirect_after=https://evil.com/phishing", follow_redirects=False)
+        assert response.status_code in [307, 302]  # Still redirects to OAuth, but URL is normalized
         
-        with patch("httpx.AsyncClient.get") as mock_get:
-            mock_user_response = Mock()
-            mock_user_response.status_code = 200
-            mock_user_response.json.return_value = {"login": "testuser", "name": "Test", "avatar_url": ""}
-            mock_user_response.raise_for_status = Mock()
-            mock_get.return_value = mock_user_response
-            
-            response = client.get("/auth/github/callback?code=test", follow_redirects=False)
-            assert response.status_code in [303, 307, 302]
-            # The redirect should preserve query params (tested via real app behavior)
-
+        # Verify by checking callback redirects to /, not evil.com
+        # First, get session from login
+        response = await aclient.get("/auth/github?redirect_after=https://evil.com/phishing", follow_redirects=False)
+        
+        response = await aclient.get("/auth/github/callback?code=test", follow_redirects=False)
+        assert response.status_code in [303, 307, 302]
+        # The redirect should be to /, not evil.com (validated by validate_redirect_url)
+        assert response.headers["location"] == "/"
+    
+    @pytest.mark.asyncio
+    async def test_oauth_callback_redirects_to_saved_url(self, aclient):
+        """Test that OAuth callback redirects to saved URL"""
+        # FastAPI TestClient doesn't support session_transaction
+        # Instead, we'll test by first calling github_login to set session,
+        # then mocking the callback
+        # First, call github_login to set up session
+        response = await aclient.get("/auth/github?redirect_after=/?owner=test&repo=test", follow_redirects=False)
+        assert response.status_code in [307, 302]
+        
+        response = await aclient.get("/auth/github/callback?code=test_code", follow_redirects=False)
+        
+        # Should redirect to saved URL
+        assert response.status_code in [303, 307, 302]
+        assert response.headers["location"].startswith("/?owner=test")
+    
+    @pytest.mark.asyncio
+    async def test_oauth_callback_validates_redirect_url(self, aclient):
+        """Test that OAuth callback validates redirect URL before redirecting"""
+        # Test validation by calling github_login with external URL
+        # The external URL should be normalized to "/" during login
+        response = await aclient.get("/auth/github?redirect_after=https://evil.com/phishing", follow_redirects=False)
+        assert response.status_code in [307, 302]
+        
+        response = await aclient.get("/auth/github/callback?code=test_code", follow_redirects=False)
+        
+        # Should redirect, but to "/" (safe fallback), not to evil.com
+        assert response.status_code in [303, 307, 302]
+        assert response.headers["location"] == "/"
+    
+    @pytest.mark.asyncio
+    async def test_redirect_url_preserves_query_params_via_real_request(self, aclient):
+        """Test that redirect URL preserves query parameters via real HTTP request"""
+        # Test with multiple query parameters - save via login
+        redirect_url = "/?owner=testowner&repo=testrepo&workflow_id=ci.yml&ref=main&param1=value1&param2=value2"
+        response = await aclient.get(f"/auth/github?redirect_after={redirect_url}", follow_redirects=False)
+        assert response.status_code in [307, 302]
+        
+        # Verify it's preserved through callback
+        response = await aclient.get("/auth/github/callback?code=test", follow_redirects=False)
+        assert response.status_code in [303, 307, 302]
+        # The redirect should preserve query params (tested via real app behavior)
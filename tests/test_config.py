@@ -1,82 +1,30 @@
 """
 Tests for configuration module
 """
-import os
 import pytest
-from unittest.mock import patch
-
-
-def test_auto_open_run_default():
-    """Test AUTO_OPEN_RUN default value"""
-    with patch.dict(os.environ, {}, clear=True):
-        import importlib
-        import config
-        importlib.reload(config)
-        # Default should be True
-        assert config.AUTO_OPEN_RUN is True
-
-
-def test_auto_open_run_from_env():
-    """Test AUTO_OPEN_RUN from environment variable"""
-    with patch.dict(os.environ, {"AUTO_OPEN_RUN": "false"}, clear=False):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert config.AUTO_OPEN_RUN is False
-
-
-def test_branch_filter_patterns_default():
-    """Test BRANCH_FILTER_PATTERNS default values"""
-    with patch.dict(os.environ, {}, clear=True):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert len(config.BRANCH_FILTER_PATTERNS) > 0
-        assert "^main$" in config.BRANCH_FILTER_PATTERNS
-
-
-def test_branch_filter_patterns_from_env():
-    """Test BRANCH_FILTER_PATTERNS from environment variable"""
-    with patch.dict(os.environ, {"BRANCH_FILTER_PATTERNS": "^main$,^develop$"}, clear=False):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert "^main$" in config.BRANCH_FILTER_PATTERNS
-        assert "^develop$" in config.BRANCH_FILTER_PATTERNS
-
-
-def test_check_permissions_default():
-    """Test CHECK_PERMISSIONS default value"""
-    with patch.dict(os.environ, {}, clear=True):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert config.CHECK_PERMISSIONS is True
-
-
-def test_check_permissions_from_env():
-    """Test CHECK_PERMISSIONS from environment variable"""
-    with patch.dict(os.environ, {"CHECK_PERMISSIONS": "false"}, clear=False):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert config.CHECK_PERMISSIONS is False
-
-
-def test_use_user_token_for_workflows_default():
-    """Test USE_USER_TOKEN_FOR_WORKFLOWS default value"""
-    with patch.dict(os.environ, {}, clear=True):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert config.USE_USER_TOKEN_FOR_WORKFLOWS is True
-
-
-def test_use_user_token_for_workflows_from_env():
-    """Test USE_USER_TOKEN_FOR_WORKFLOWS from environment variable"""
-    with patch.dict(os.environ, {"USE_USER_TOKEN_FOR_WORKFLOWS": "false"}, clear=False):
-        import importlib
-        import config
-        importlib.reload(config)
-        assert config.USE_USER_TOKEN_FOR_WORKFLOWS is False
 
+from config import _env_flag, _branch_filter_patterns
+
+
+@pytest.mark.parametrize("name", ["AUTO_OPEN_RUN", "CHECK_PERMISSIONS", "USE_USER_TOKEN_FOR_WORKFLOWS"])
+@pytest.mark.parametrize("value, expected", [
+    # Not set - enabled by default
+    (None, True),
+    ("false", False),
+    ("TRUE", True),
+], ids=["default", "false", "true_uppercase"])
+def test_boolean_settings(name, value, expected):
+    """Test boolean settings default to True and can be disabled via environment"""
+    env = {} if value is None else {name: value}
+    assert _env_flag(env, name) is expected
+
+
+@pytest.mark.parametrize("env, expected", [
+    ({}, ["^main$", "^stable-.*", "^stream-.*"]),
+    ({"BRANCH_FILTER_PATTERNS": "^main$,^develop$"}, ["^main$", "^develop$"]),
+    # Blank items are dropped, items are stripped
+    ({"BRANCH_FILTER_PATTERNS": " ^main$ ,, "}, ["^main$"]),
+], ids=["default", "from_env", "strip_blank"])
+def test_branch_filter_patterns(env, expected):
+    """Test BRANCH_FILTER_PATTERNS default values and override from environment"""
+    assert _branch_filter_patterns(env) == expected
@@ -1,29 +1,36 @@
 """
 Tests for service modules
 """
+import re
+import time
+import asyncio
+import urllib.parse
+from datetime import datetime, timezone, timedelta
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 import jwt
-import time
+import orjson
 
+import config
+from backend.services import cache, github_app
+from backend.services.github_app import generate_jwt
+from backend.services.github_oauth import get_oauth_url
+from backend.services.http_client import conditional_get, send_with_retry
+from backend.services.permissions import check_repository_access
+from backend.services.workflow import _parse_gh_ts, find_workflow_run, poll_for_workflow_run
+from backend.services.workflow_info import (
+    _normalize_input,
+    _parse_workflow_inputs,
+    get_workflow_info,
+    get_workflows_info_bulk
+)
+from backend.services.workflows import get_workflows_with_inputs
+from tests.conftest import async_return
 
-def test_github_app_generate_jwt():
+
+def test_github_app_generate_jwt(rsa_private_key_pem):
     """Test JWT generation for GitHub App - verifies structure and app_id"""
-    from backend.services.github_app import generate_jwt
-    from cryptography.hazmat.primitives.asymmetric import rsa
-    from cryptography.hazmat.primitives import serialization
-    
-    # Generate a real RSA key for testing
-    private_key_obj = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048
-    )
-    private_key = private_key_obj.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    ).decode('utf-8')
-    
+    private_key = rsa_private_key_pem
     app_id = "123456"
     
     # Test that JWT is generated correctly
@@ -36,16 +43,15 @@ def test_github_app_generate_jwt():
     assert decoded["iss"] == app_id
     assert "iat" in decoded
     assert "exp" in decoded
+    # Signed JWT is reused while it is still valid
+    assert generate_jwt(app_id, private_key) == token
 
 
 def test_config_branch_filter_patterns():
     """Test that branch filter patterns are used correctly in application behavior"""
-    import config
-    import re
-    
     # Test that patterns are actually used for filtering (not just that they exist)
-    # This tests real behavior: patterns should filter branches
-    patterns = config.BRANCH_FILTER_PATTERNS
+    # This tests real behavior: precompiled patterns filter branches the same way get_branches does
+    regexes = config.BRANCH_FILTER_REGEXES
     
     # Test that patterns work as expected for common branch names
     test_branches = ["main", "develop", "stable-1.0", "feature/test", "release/v2.0"]
@@ -53,7 +59,7 @@ def test_config_branch_filter_patterns():
     # Count how many branches would match
     matching_count = sum(
         1 for branch in test_branches 
-        if any(re.match(pattern, branch) for pattern in patterns)
+        if any(regex.search(branch) for regex in regexes)
     )
     
     # At least some branches should match (main, stable-*, etc.)
@@ -63,9 +69,6 @@ def test_config_branch_filter_patterns():
 @pytest.mark.asyncio
 async def test_oauth_url_generation():
     """Test OAuth URL generation"""
-    from backend.services.github_oauth import get_oauth_url
-    import urllib.parse
-    
     with patch.dict("os.environ", {
         "GITHUB_CLIENT_ID": "test_client_id",
         "GITHUB_CALLBACK_URL": "http://localhost:8000/auth/github/callback"
@@ -87,24 +90,406 @@ async def test_oauth_url_generation():
 
 def test_config_values_are_valid():
     """Test that configuration values are valid and usable"""
-    import config
-    import re
-    
     # Test that config values have correct types and can be used
     assert isinstance(config.CHECK_PERMISSIONS, bool), "CHECK_PERMISSIONS should be boolean"
     assert isinstance(config.USE_USER_TOKEN_FOR_WORKFLOWS, bool), "USE_USER_TOKEN_FOR_WORKFLOWS should be boolean"
     assert isinstance(config.AUTO_OPEN_RUN, bool), "AUTO_OPEN_RUN should be boolean"
     assert isinstance(config.BRANCH_FILTER_PATTERNS, list), "BRANCH_FILTER_PATTERNS should be a list"
     
-    # Test that patterns are valid regex and can actually match branches
-    if config.BRANCH_FILTER_PATTERNS:
-        for pattern in config.BRANCH_FILTER_PATTERNS:
-            # Should compile as regex
-            compiled = re.compile(pattern)
-            # Should be able to match at least one test branch
-            test_branches = ["main", "develop", "stable-1.0", "feature/test"]
-            matches = any(compiled.match(branch) for branch in test_branches)
-            # At least one pattern should match common branches
-            if pattern == "^main$":
-                assert compiled.match("main"), f"Pattern {pattern} should match 'main'"
+    # Every pattern is compiled once at import, in the same order
+    assert len(config.BRANCH_FILTER_REGEXES) == len(config.BRANCH_FILTER_PATTERNS)
+    for pattern, regex in zip(config.BRANCH_FILTER_PATTERNS, config.BRANCH_FILTER_REGEXES):
+        assert isinstance(regex, re.Pattern)
+        if pattern == "^main$":
+            assert regex.match("main"), f"Pattern {pattern} should match 'main'"
+    
+    # Invalid regex falls back to a literal match instead of failing at import
+    assert config._compile_branch_pattern("release[").search("release[1]")
+    assert not config._compile_branch_pattern("release[").search("RELEASE[1]")
+
+
+@pytest.mark.asyncio
+async def test_cached_decorator_coalesces_concurrent_calls():
+    """Test that concurrent cache misses for the same key run the function once"""
+    calls = []
+    
+    @cache.cached(ttl=60, key_prefix="test_coalesce:")
+    async def slow_lookup(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+    
+    results = await asyncio.gather(*[slow_lookup(21) for _ in range(5)])
+    
+    assert results == [42] * 5
+    assert calls == [21]
+    # Subsequent call is served from cache
+    assert await slow_lookup(21) == 42
+    assert calls == [21]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_without_caching():
+    """Test that single_flight shares one in-flight call but does not cache results"""
+    calls = []
+    
+    @cache.single_flight(key_prefix="test_single_flight:")
+    async def poll(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+    
+    results = await asyncio.gather(*[poll(1) for _ in range(3)])
+    
+    assert results == [1, 1, 1]
+    assert calls == [1]
+    # Next call after completion runs again
+    assert await poll(1) == 1
+    assert calls == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_leader_cancellation_does_not_cancel_waiters():
+    """Test that waiters retry the computation when the coroutine running it is cancelled"""
+    calls = []
+    
+    @cache.single_flight(key_prefix="test_single_flight_cancel:")
+    async def poll(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+    
+    leader = asyncio.create_task(poll(1))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(poll(1))
+    await asyncio.sleep(0)
+    leader.cancel()
+    
+    assert await waiter == 1
+    assert leader.cancelled()
+    assert calls == [1, 1]
+
+
+def test_cache_purges_expired_entries():
+    """Test that expired entries are purged from the cache, not only on access to their key"""
+    cache.clear()
+    with patch("backend.services.cache.time.time", return_value=1000.0):
+        cache.set("short", "value", ttl=10)
+        cache.set("long", "value", ttl=100)
+        # Overwrite with a longer TTL - the old heap entry must not evict it
+        cache.set("overwritten", "old", ttl=10)
+        cache.set("overwritten", "new", ttl=100)
+    
+    with patch("backend.services.cache.time.time", return_value=1050.0):
+        stats = cache.get_cache_stats()
+        assert stats["total_keys"] == 2
+        assert cache.get("long") == "value"
+        assert cache.get("overwritten") == "new"
+        assert cache.get("short") is None
+    
+    cache.clear()
+
+
+def test_cache_evicts_least_recently_used():
+    """Test that cache size is bounded and least recently used entries are evicted first"""
+    cache.clear()
+    with patch("backend.services.cache._max_size", 2):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Touch "a" so "b" becomes least recently used
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.get_cache_stats()["max_size"] == 2
+    
+    cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_reuses_response_on_not_modified():
+    """Test that conditional_get sends If-None-Match and returns stored response on 304"""
+    cache.clear()
+    first_response = Mock(status_code=200, headers={"ETag": '"abc"'})
+    not_modified_response = Mock(status_code=304, headers={})
+    
+    with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+        mock_get.side_effect = [first_response, not_modified_response]
+        headers = {"Authorization": "token test"}
+        
+        assert await conditional_get("https://api.github.com/user", headers) is first_response
+        assert await conditional_get("https://api.github.com/user", headers) is first_response
+        
+        second_call_headers = mock_get.call_args_list[1].kwargs["headers"]
+        assert second_call_headers["If-None-Match"] == '"abc"'
+        # Caller's headers dict is not modified
+        assert "If-None-Match" not in headers
+    
+    cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_check_repository_access_caches_denial():
+    """Test that a denied repository access check is cached"""
+    cache.clear()
+    with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = Mock(status_code=404, headers={})
+        
+        assert await check_repository_access("owner", "repo", "token") is False
+        assert await check_repository_access("owner", "repo", "token") is False
+        assert mock_get.call_count == 1
+        
+        # Different token is checked separately
+        assert await check_repository_access("owner", "repo", "other") is False
+        assert mock_get.call_count == 2
+        
+        # Rate-limited 403 is not a permission denial and is not cached
+        reset = str(int(time.time()) + 3600)
+        mock_get.return_value = Mock(status_code=403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset})
+        assert await check_repository_access("owner", "limited", "token") is False
+        assert await check_repository_access("owner", "limited", "token") is False
+        assert mock_get.call_count == 4
+    
+    cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_installation_token_is_cached():
+    """Test that installation token is reused until shortly before expiry"""
+    github_app._installation_token_cache.clear()
+    expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    token_response = Mock(status_code=201)
+    token_response.content = orjson.dumps({"token": "ghs_test", "expires_at": expires_at})
+    
+    with patch("backend.services.github_app.generate_jwt", return_value="jwt"):
+        with patch("httpx.AsyncClient.post", new_callable=AsyncMock) as mock_post:
+            mock_post.return_value = token_response
+            
+            # Concurrent first requests share one refresh
+            tokens = await asyncio.gather(*(github_app.get_installation_token("1", "2", "key") for _ in range(3)))
+            assert tokens == ["ghs_test"] * 3
+            assert await github_app.get_installation_token("1", "2", "key") == "ghs_test"
+            assert mock_post.call_count == 1
+    
+    github_app._installation_token_cache.clear()
+
+
+def test_parse_github_timestamp():
+    """Test fast GitHub timestamp parser matches fromisoformat().timestamp()"""
+    expected = datetime(2024, 1, 15, 10, 30, 5, tzinfo=timezone.utc).timestamp()
+    assert _parse_gh_ts("2024-01-15T10:30:05Z") == expected
+    # Other ISO 8601 forms fall back to the generic parser
+    assert _parse_gh_ts("2024-01-15T10:30:05+00:00") == expected
+    
+    with pytest.raises(ValueError):
+        _parse_gh_ts("not a timestamp")
+
+
+@pytest.mark.asyncio
+async def test_poll_for_workflow_run_retries_with_backoff():
+    """Test that poll_for_workflow_run retries until the run appears"""
+    run = {"id": 1}
+    with patch("backend.services.workflow.find_workflow_run", new_callable=AsyncMock) as mock_find:
+        mock_find.side_effect = [None, None, run]
+        with patch("backend.services.workflow.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            result = await poll_for_workflow_run("owner", "repo", "ci.yml", datetime.now(timezone.utc))
+    
+    assert result == run
+    assert mock_find.call_count == 3
+    delays = [call.args[0] for call in mock_sleep.call_args_list]
+    assert len(delays) == 2
+    # Exponential backoff with up to 50% jitter
+    assert 1.0 <= delays[0] <= 1.5
+    assert 2.0 <= delays[1] <= 3.0
+
+
+@pytest.mark.asyncio
+async def test_find_workflow_run_matches_app_run_in_window():
+    """Test that find_workflow_run picks the app-triggered run inside the trigger window"""
+    cache.clear()
+    trigger_time = datetime.now(timezone.utc) - timedelta(seconds=10)
+    
+    def ts(offset):
+        return (trigger_time + timedelta(seconds=offset)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    
+    runs = {"workflow_runs": [
+        {"id": 3, "created_at": ts(60), "actor": {"login": "my-app[bot]", "type": "Bot"}},
+        {"id": 2, "created_at": ts(2), "actor": {"login": "someone", "type": "User"}},
+        {"id": 1, "created_at": ts(1), "actor": {"login": "my-app[bot]", "type": "Bot"}},
+        {"id": 0, "created_at": ts(-60), "actor": {"login": "my-app[bot]", "type": "Bot"}},
+    ]}
+    runs_response = Mock(status_code=200, headers={}, content=orjson.dumps(runs))
+    
+    with patch("backend.services.workflow.get_app_installation_token", new=async_return("token")), \
+         patch("backend.services.workflow.get_app_slug", new=async_return("my-app")), \
+         patch("backend.services.workflow.get_app_credentials", return_value=("1", "2", "key.pem")), \
+         patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = runs_response
+        
+        run = await find_workflow_run("owner", "repo", "ci.yml", trigger_time)
+    
+    assert run["id"] == 1
+    cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_send_with_retry_retries_server_errors():
+    """Test that 5xx responses are retried for idempotent requests only"""
+    error_response = Mock(status_code=502, headers={})
+    ok_response = Mock(status_code=200, headers={})
+    
+    with patch("backend.services.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        send = AsyncMock(side_effect=[error_response, ok_response])
+        assert await send_with_retry(send) is ok_response
+        assert send.call_count == 2
+        assert mock_sleep.call_count == 1
+        
+        # Non-idempotent request is not repeated after 5xx
+        send = AsyncMock(side_effect=[error_response, ok_response])
+        assert await send_with_retry(send, idempotent=False) is error_response
+        assert send.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_send_with_retry_waits_for_rate_limit_reset():
+    """Test that rate-limited responses are retried after X-RateLimit-Reset"""
+    reset = str(int(time.time()) + 5)
+    limited_response = Mock(status_code=403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset})
+    ok_response = Mock(status_code=204, headers={})
+    forbidden_response = Mock(status_code=403, headers={})
+    
+    with patch("backend.services.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        send = AsyncMock(side_effect=[limited_response, ok_response])
+        assert await send_with_retry(send, idempotent=False) is ok_response
+        assert mock_sleep.call_args.args[0] >= 3
+        
+        # Plain 403 (no permission) is returned immediately
+        send = AsyncMock(return_value=forbidden_response)
+        assert await send_with_retry(send) is forbidden_response
+        assert send.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_workflows_info_bulk():
+    """Test bulk workflow info returns results keyed by workflow id"""
+    async def fake_info(owner, repo, workflow_id):
+        if workflow_id == "broken.yml":
+            raise RuntimeError("boom")
+        return {"found": True, "name": workflow_id}
+    
+    with patch("backend.services.workflow_info.get_workflow_info", side_effect=fake_info):
+        result = await get_workflows_info_bulk("owner", "repo", ["ci.yml", "broken.yml", "deploy.yml"])
+    
+    # Failed lookup is reported as not found instead of failing the whole batch
+    assert result == {
+        "ci.yml": {"found": True, "name": "ci.yml"},
+        "broken.yml": {"found": False, "inputs": {}, "has_workflow_dispatch": False},
+        "deploy.yml": {"found": True, "name": "deploy.yml"}
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_workflows_with_inputs():
+    """Test workflows list is merged with inputs fetched in bulk"""
+    workflows = [{"id": "ci.yml", "name": "CI", "path": ".github/workflows/ci.yml", "state": "active"}]
+    infos = {"ci.yml": {"found": True, "inputs": {"debug": {"type": "boolean"}}, "has_workflow_dispatch": True}}
+    
+    with patch("backend.services.workflows.get_workflows", new=async_return(workflows)), \
+         patch("backend.services.workflows.get_workflows_info_bulk", new_callable=AsyncMock, return_value=infos) as mock_bulk:
+        result = await get_workflows_with_inputs("owner", "repo")
+    
+    mock_bulk.assert_awaited_once_with("owner", "repo", ["ci.yml"])
+    assert result == [{**workflows[0], "inputs": {"debug": {"type": "boolean"}}, "has_workflow_dispatch": True}]
+
+
+@pytest.mark.asyncio
+async def test_get_workflow_info_fetches_default_path_concurrently():
+    """Test workflow metadata and file at the default path are fetched without a second round"""
+    meta_response = Mock(status_code=200, content=b'{"name": "CI", "path": ".github/workflows/spec.yml", "state": "active"}')
+    file_response = Mock(status_code=200, headers={}, text="on:\n  workflow_dispatch:\n")
+    
+    async def fake_get(url, headers, params=None):
+        return file_response if "/contents/" in url else meta_response
+    
+    with patch("backend.services.workflow_info.get_app_installation_token", new=async_return("token")), \
+         patch("backend.services.workflow_info.conditional_get", side_effect=fake_get) as mock_get:
+        info = await get_workflow_info("spec-owner", "spec-repo", "spec.yml")
+    
+    assert info["found"] is True
+    assert info["has_workflow_dispatch"] is True
+    assert mock_get.call_count == 2
+
 
+def test_normalize_workflow_input():
+    """Test normalization of workflow_dispatch input definitions"""
+    assert _normalize_input({"description": "Name"}) == {
+        "type": "string", "description": "Name", "required": False, "default": None
+    }
+    assert _normalize_input({"type": "choice", "options": ["a", "b"], "default": "a"})["options"] == ["a", "b"]
+    assert _normalize_input({"type": "choice", "options": "a"})["options"] == []
+    assert _normalize_input({"type": "boolean", "default": "true"})["default"] is True
+    assert _normalize_input({"type": "boolean", "default": "On"})["default"] is True
+    assert _normalize_input({"type": "boolean", "default": "no"})["default"] is False
+    assert _normalize_input({"type": "boolean"})["default"] is False
+
+
+def test_parse_workflow_inputs():
+    """Test extraction of workflow_dispatch inputs from workflow YAML"""
+    content = """
+name: CI
+on:
+  push:
+  workflow_dispatch:
+    inputs:
+      test_type:
+        type: choice
+        options: [unit, integration]
+      verbose:
+        type: boolean
+        default: "true"
+"""
+    inputs, has_workflow_dispatch = _parse_workflow_inputs(content)
+    
+    assert has_workflow_dispatch is True
+    assert inputs["test_type"]["options"] == ["unit", "integration"]
+    assert inputs["verbose"]["default"] is True
+    
+    assert _parse_workflow_inputs("on: push\n") == ({}, False)
+    
+    # Quoted key and an alias to an anchor defined outside the 'on' section
+    content = """
+env: &default_input
+  type: string
+  default: main
+"on":
+  workflow_dispatch:
+    inputs:
+      branch: *default_input
+"""
+    inputs, has_workflow_dispatch = _parse_workflow_inputs(content)
+    
+    assert has_workflow_dispatch is True
+    assert inputs["branch"]["default"] == "main"
+
+
+@pytest.mark.parametrize("key", ["On", "ON", "true", "True"])
+def test_parse_workflow_inputs_yaml11_on_key(key):
+    """Test that YAML 1.1 spellings of the 'on' key are found by the partial parse"""
+    content = f"""
+name: CI
+{key}:
+  workflow_dispatch:
+    inputs:
+      branch:
+        type: string
+        default: main
+jobs:
+  build:
+    runs-on: ubuntu-latest
+"""
+    inputs, has_workflow_dispatch = _parse_workflow_inputs(content)
+    
+    assert has_workflow_dispatch is True
+    assert inputs["branch"]["default"] == "main"